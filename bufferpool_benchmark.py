@@ -0,0 +1,166 @@
+from lstore.Bufferpool import PAGE_SIZE
+from lstore.db import Database
+from lstore.query import Query
+
+from random import Random
+from timeit import default_timer as timer
+import os
+import shutil
+import threading
+
+# multithreaded stress test of the bufferpool: every thread updates and selects its own share of the records
+# through a pool much smaller than the table, so pages are evicted and reloaded all the time
+# run once with a single partition (one latch for the whole pool) and once with the pool split in partitions
+number_of_records = 2000
+number_of_operations = 2000 # per thread
+num_threads = 8
+capacity = 400
+
+def stress(num_partitions):
+    path = './BP_benchmark'
+    shutil.rmtree(path, ignore_errors=True)
+    db = Database(capacity*PAGE_SIZE)
+    db.open(path)
+    db.bufferpool.num_partitions = num_partitions
+    db.bufferpool.init_partitions()
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    query.insert_many([[key, 0, 0, 0, 0] for key in range(number_of_records)])
+    expected = {}
+
+    def run(i):
+        random = Random(i)
+        keys = [key for key in range(number_of_records) if key % num_threads == i] # no two threads write the same record
+        for j in range(number_of_operations):
+            key = random.choice(keys)
+            if j % 2 == 0:
+                query.update(key, None, j, None, None, i)
+                expected[key] = [key, j, 0, 0, i]
+            else:
+                query.select(key, 0, [1, 1, 1, 1, 1])
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(num_threads)]
+    start = timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    end = timer()
+    errors = 0
+    for key in range(number_of_records):
+        if query.select(key, 0, [1, 1, 1, 1, 1])[0].columns != expected.get(key, [key, 0, 0, 0, 0]):
+            errors += 1
+    pinned = sum(entry[1].pin for entry in db.bufferpool.pool.values())
+    stats = dict(db.bufferpool.stats)
+    db.close()
+    shutil.rmtree(path, ignore_errors=True)
+    return end - start, errors, pinned, stats
+
+for num_partitions in (1, 8):
+    seconds, errors, pinned, stats = stress(num_partitions)
+    print(num_partitions, "partition(s):  \t", round(seconds, 2), "seconds,", round(num_threads*number_of_operations/seconds), "queries/second,", errors, "wrong records,", pinned, "pages left pinned")
+    print("                \t", stats["flushed"], "pages flushed in the background,", stats["clean_evictions"], "clean and", stats["dirty_evictions"], "dirty pages evicted")
+
+
+# range aggregates over a table that is only on disk (cold pool), with and without prefetching (off by default)
+def cold_sum(prefetch_depth):
+    path = './BP_cold'
+    db = Database()
+    db.open(path)
+    db.bufferpool.prefetch_depth = prefetch_depth
+    query = Query(db.get_table('Grades'))
+    start = timer()
+    total = query.sum(0, number_of_cold_records - 1, 2)
+    scanned = sum(1 for record in query.scan([(1, '>=', 0)], [1, 0, 0, 0, 0]))
+    end = timer()
+    prefetched = db.bufferpool.stats["prefetched"]
+    db.close()
+    return end - start, total, scanned, prefetched
+
+number_of_cold_records = 50000
+shutil.rmtree('./BP_cold', ignore_errors=True)
+db = Database()
+db.open('./BP_cold')
+query = Query(db.create_table('Grades', 5, 0))
+query.insert_many([[key, key % 100, key % 7, 0, 0] for key in range(number_of_cold_records)])
+db.close()
+for prefetch_depth in (0, 4, 16):
+    seconds, total, scanned, prefetched = cold_sum(prefetch_depth)
+    print("prefetch depth", prefetch_depth, ":  \t", round(seconds, 2), "seconds for a cold sum and scan (sum", total, ",", scanned, "records),", prefetched, "pages prefetched")
+shutil.rmtree('./BP_cold', ignore_errors=True)
+
+
+# point lookups on a small hot table before and after a full scan of a large table sharing the same pool
+# the scan reads through a ring buffer, so the hot table should still be in the pool afterwards
+shutil.rmtree('./BP_ring', ignore_errors=True)
+db = Database(400*PAGE_SIZE)
+db.open('./BP_ring')
+hot_query = Query(db.create_table('Hot', 5, 0))
+hot_query.insert_many([[key, 0, 0, 0, 0] for key in range(1000)])
+large_query = Query(db.create_table('Large', 5, 0))
+for start in range(0, number_of_cold_records, 5000):
+    large_query.insert_many([[key, key % 100, 0, 0, 0] for key in range(start, start+5000)])
+for key in range(1000):
+    hot_query.select(key, 0, [1, 1, 1, 1, 1])
+hot_pages = [(name, page_key, is_base) for name, page, page_key, is_base in db.bufferpool.pool.values() if name == 'Hot']
+large_query.sum(0, number_of_cold_records - 1, 1)
+sum(1 for record in large_query.scan([(1, '>=', 50)], [1, 0, 0, 0, 0]))
+still_cached = set((name, page_key, is_base) for name, page, page_key, is_base in db.bufferpool.pool.values()) & set(hot_pages)
+print("hot table pages still in the pool after a large scan:  \t", len(still_cached), "/", len(hot_pages))
+db.close()
+shutil.rmtree('./BP_ring', ignore_errors=True)
+
+
+# point lookups on a small hot table while a large table is loaded and updated through the same pool
+# with a minimum quota the hot table keeps its pages, without one the large table evicts them
+def hot_lookups(min_pages):
+    path = './BP_quota'
+    shutil.rmtree(path, ignore_errors=True)
+    db = Database(400*PAGE_SIZE)
+    db.open(path)
+    hot_query = Query(db.create_table('Hot', 5, 0, min_pages=min_pages))
+    hot_query.insert_many([[key, 0, 0, 0, 0] for key in range(1000)])
+    large_query = Query(db.create_table('Large', 5, 0))
+    for key in range(20000):
+        large_query.insert(key, key % 100, 0, 0, 0)
+    for key in range(0, 20000, 4):
+        large_query.update(key, None, 1, None, None, None)
+    hot_pages = db.bufferpool.table_page_count('Hot')
+    start = timer()
+    for key in range(1000):
+        hot_query.select(key, 0, [1, 1, 1, 1, 1])
+    end = timer()
+    db.close()
+    shutil.rmtree(path, ignore_errors=True)
+    return hot_pages, end - start
+
+for min_pages in (0, 120):
+    hot_pages, seconds = hot_lookups(min_pages)
+    print("hot table min_pages", min_pages, ":  \t", hot_pages, "pages still in the pool,", round(seconds, 3), "seconds for 1000 lookups")
+
+
+# disk footprint and cold sum of the data columns of a table, plain text pages vs compressed pages
+def compressed_table(compression):
+    path = './BP_compression'
+    shutil.rmtree(path, ignore_errors=True)
+    db = Database()
+    db.open(path)
+    query = Query(db.create_table('Grades', 5, 0, compression=compression))
+    random = Random(0)
+    query.insert_many([[key, random.randint(0, 20), key // 50, 7, random.randint(-100, 100)] for key in range(number_of_cold_records)])
+    db.close()
+    db = Database()
+    db.open(path)
+    table = db.get_table('Grades')
+    data_pages = [file for page_key, file in table.page_directory.items() if page_key % (table.num_columns+4) >= 5] #every data column but the key
+    footprint = sum(os.path.getsize(file) for file in data_pages)
+    start = timer()
+    total = sum(Query(table).sum(0, number_of_cold_records - 1, column) for column in range(1, 5))
+    end = timer()
+    db.close()
+    shutil.rmtree(path, ignore_errors=True)
+    return footprint, end - start, total
+
+for compression in (None, {1: 'auto', 2: 'auto', 3: 'auto', 4: 'auto'}):
+    footprint, seconds, total = compressed_table(compression)
+    print("compression", "off" if compression is None else "auto", ":  \t", footprint, "bytes of data pages on disk,", round(seconds, 2), "seconds for a cold sum of 4 columns (total", total, ")")
@@ -1,22 +1,175 @@
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
+from lstore import compression
 from lstore.lru import LRU
 from lstore.page import Page
 import os
 from pathlib import Path
 import pickle
+import queue
 import threading
+import time
+
+PAGE_SIZE = len(Page().data) #bytes of one page in memory
+
+class Partition: #one hash partition of the bufferpool, with its own frames, latch and eviction
+    def __init__(self, budget):
+        self.budget = budget     # bytes the pages of the partition may use
+        self.used = 0            # bytes used by the pages in pool, only changed by add/remove/replace
+        self.pool = {}           # Dictionary to store buffer pages indexed by buffer_id
+        self.buffer_ids = {}     # key: (t_name, page_key, is_base), value: buffer_id of the page in pool
+        self.table_pages = {}    # key: t_name, value: pages of the table in pool
+        self.thread_lock = threading.Lock() #held while the frames of the partition are looked up, added or evicted
+
+    def add(self, buffer_id, t_name, page, page_key, is_base): #must be called holding thread_lock, like remove and replace
+        self.pool[buffer_id] = [t_name, page, page_key, is_base]
+        self.buffer_ids[(t_name, page_key, is_base)] = buffer_id
+        self.used += len(page.data)
+        self.table_pages[t_name] = self.table_pages.get(t_name, 0) + 1
+
+    def remove(self, buffer_id): #returns the removed entry [t_name, page, page_key, is_base]
+        entry = self.pool.pop(buffer_id)
+        del self.buffer_ids[(entry[0], entry[2], entry[3])]
+        self.used -= len(entry[1].data)
+        self.table_pages[entry[0]] -= 1
+        return entry
+
+    def replace(self, buffer_id, page): #swaps the page of a frame for another version of it
+        self.used += len(page.data) - len(self.pool[buffer_id][1].data)
+        self.pool[buffer_id][1] = page
+
+    def is_full(self, size=0): #True if a page of size bytes doesn't fit in the budget anymore
+        return self.used + size > self.budget
+
+class RingBuffer: #a few frames a large scan reads through instead of the shared pool, so the scan doesn't evict the pages other queries use
+    def __init__(self, size=32):
+        self.size = size
+        self.pages = OrderedDict() # key: (t_name, page_key, is_base), value: (path of the file the page was read from, page), oldest first
+        self.thread_lock = threading.Lock()
+
+    def get(self, key, path): #returns None unless the page was read from the file that is still the latest one
+        with self.thread_lock:
+            entry = self.pages.get(key)
+            if entry is None or entry[0] != path:
+                return None
+            return entry[1]
+
+    def add(self, key, path, page): #the oldest page leaves the ring once it is full
+        with self.thread_lock:
+            self.pages[key] = (path, page)
+            self.pages.move_to_end(key)
+            while len(self.pages) > self.size:
+                self.pages.popitem(last=False)
 
 #Can be accessed from table class and vice versa
 class BufferPool:
-    def __init__(self, path='none', capacity=1000):
+    """
+    # pages are spread over num_partitions partitions by hashing (table name, page key, is_base)
+    # threads using pages of different partitions never wait on each other
+    :param path: string            #path where pickle metadata can be saved
+    :param memory_budget: int      #bytes the pages of the whole pool may use, split evenly between the partitions
+    :param num_partitions: int
+    :param dirty_ratio: float      #a background thread writes dirty pages to disk once more than this share of the frames are dirty
+    :param flush_interval: float   #seconds between two checks of the dirty ratio
+    :param prefetch_depth: int     #page sets loaded ahead of a sequential scan by a background thread (0 turns prefetching off)
+    #                               off by default: page files in the OS cache parse faster in the scanning thread than the prefetch thread overlaps them
+    # eviction drops clean pages first so a page fault only has to write a page when no clean page is left
+    # tables can get a minimum and maximum number of pages in the pool (set_quota)
+    """
+    def __init__(self, path='none', memory_budget=1000*PAGE_SIZE, num_partitions=8, dirty_ratio=0.25, flush_interval=0.05, prefetch_depth=0):
         self.parent_path = path          # path where pickle metadata can be saved.
-        #self.LRU = LRU()         
-        self.capacity = capacity  
-        self.pool = {}           # Dictionary to store buffer pages indexed by buffer_id
+        #self.LRU = LRU()
+        self.memory_budget = memory_budget
+        self.num_partitions = num_partitions
+        self.quotas = {} # key: t_name, value: (min_pages, max_pages), max_pages None means no maximum
+        self.init_partitions()
         self.disk_page_count = 0
         self.table_access = {}
-        self.thread_lock = threading.Lock()
-        self.eviction_thread_lock = threading.Lock()
+        self.thread_lock = threading.Lock() #guards disk_page_count
+        self.dirty_ratio = dirty_ratio
+        self.flush_interval = flush_interval
+        self.flusher = None #started with the first page added to the pool
+        self.flush_event = threading.Event() #wakes the flusher before its next check
+        self.prefetch_depth = prefetch_depth
+        self.prefetcher = None #started with the first prefetch request
+        self.prefetch_lock = threading.Lock() #guards prefetcher and prefetching, so concurrent scans start a single prefetch thread
+        self.prefetch_queue = queue.Queue() #(t_name, page_key, is_base) of the pages to load
+        self.prefetching = set() #pages in prefetch_queue, a page is only queued once
+        self.last_miss = {} # key: (t_name, is_base), value: page set of the last page loaded on demand
+        self.stats = {"flushed": 0, "clean_evictions": 0, "dirty_evictions": 0, "prefetched": 0, "compressed": 0} #pages written by the flusher, pages dropped/written by evictions, pages loaded ahead and page files written compressed
+
+    def init_partitions(self):
+        self.partitions = [Partition(budget) for budget in self.partition_budgets()]
+
+    def partition_budgets(self): #the memory budget split evenly between the partitions, in whole pages
+        frames = self.memory_budget // PAGE_SIZE
+        return [(frames // self.num_partitions + (1 if i < frames % self.num_partitions else 0))*PAGE_SIZE for i in range(self.num_partitions)]
+
+    """
+    # Sets how many pages of a table the pool keeps at least and at most
+    # eviction takes pages of other tables before it goes below min_pages, e.g. for a small table that must stay fast while large tables are scanned
+    # a table at max_pages evicts one of its own pages, from the partition of the page it loads, for every page it loads
+    :param t_name: string
+    :param min_pages: int
+    :param max_pages: int          #None means no maximum
+    """
+    def set_quota(self, t_name, min_pages=0, max_pages=None):
+        if max_pages is not None and max_pages < min_pages:
+            raise ValueError("max_pages must be at least min_pages.")
+        self.quotas[t_name] = (min_pages, max_pages)
+        for partition in self.partitions: #a lower maximum applies right away
+            with partition.thread_lock:
+                while self.above_quota(t_name) and self.evict_from_partition(partition, t_name):
+                    pass
+
+    def table_page_count(self, t_name): #pages of the table in the whole pool, other partitions are read without their latch
+        return sum(partition.table_pages.get(t_name, 0) for partition in self.partitions)
+
+    def above_quota(self, t_name, extra=0): #True if the table holds more than max_pages once extra pages are added
+        max_pages = self.quotas.get(t_name, (0, None))[1]
+        return max_pages is not None and self.table_page_count(t_name) + extra > max_pages
+
+    def at_min_quota(self, t_name): #True if evicting a page of the table takes it below min_pages
+        return self.table_page_count(t_name) <= self.quotas.get(t_name, (0, None))[0]
+
+    @property
+    def capacity(self): #pages that fit in the memory budget
+        return self.memory_budget // PAGE_SIZE
+
+    @property
+    def memory_used(self): #bytes used by the pages currently in the pool
+        return sum(partition.used for partition in self.partitions)
+
+    """
+    # Changes the memory budget of the pool while it is in use
+    # a smaller budget evicts pages right away, pages that are pinned leave once they are unpinned and another page is added
+    :param memory_budget: int      #bytes
+    """
+    def resize(self, memory_budget):
+        self.memory_budget = memory_budget
+        for partition, budget in zip(self.partitions, self.partition_budgets()):
+            with partition.thread_lock:
+                partition.budget = budget
+                while partition.is_full() and self.evict_from_partition(partition):
+                    pass
+
+    def __getstate__(self): #only metadata is pickled, the frames and locks of the partitions stay in memory
+        state = self.__dict__.copy()
+        for attribute in ('partitions', 'thread_lock', 'flusher', 'flush_event', 'prefetcher', 'prefetch_lock', 'prefetch_queue'):
+            state.pop(attribute, None)
+        return state
+
+    @property
+    def pool(self): #every page of every partition, key: buffer_id, value: [t_name, page, page_key, is_base]
+        pool = {}
+        for partition in self.partitions:
+            with partition.thread_lock:
+                pool.update(partition.pool)
+        return pool
+
+    def partition(self, t_name, page_key, is_base=True): #returns the partition holding the page
+        return self.partitions[hash((t_name, page_key, is_base)) % self.num_partitions]
 
     def add_table(self, name, table):
         #print("Access to table ", name, " granted to bf")
@@ -35,165 +188,383 @@ class BufferPool:
         # Check if a buffer page with the given buffer_id is in the pool
         return buffer_id in self.pool.keys()
 
+    def next_disk_page(self): #returns a number no other page or file has used yet
+        with self.thread_lock:
+            self.disk_page_count += 1
+            return self.disk_page_count - 1
+
     def addPages(self, t_name, page, page_key, is_base=True): #should be called from table class
         # Add a new page to the buffer pool and mark it as dirty
-        #if is_base == True:
-            #print("adding a base page to pool ", page_key)
-        #else:
-            #print("adding a tail page to pool ", page_key)
-        if self.capacity == 0:
-            self.evict_bufferpool()
-        buffer_id = self.disk_page_count
-            #print("adding a buffer id to pool ", buffer_id)
-        self.pool[buffer_id] = [t_name, page, page_key, is_base]
-        self.capacity-=1
-        self.disk_page_count+=1
-            #print(" pages currently in bufferpool: ", list(self.pool.keys()))
-    
+        partition = self.partition(t_name, page_key, is_base)
+        with partition.thread_lock:
+            return self.add_to_partition(partition, t_name, page, page_key, is_base)
+
     def initPages(self, t_name, page, page_key, is_base=True): #should be called from table class
         # Add a new page to the buffer pool and mark it as dirty
         #if is_base == True:
             #print("adding a base page to pool ", page_key)
         #else:
             #print("adding a tail page to pool ", page_key)
-        with self.thread_lock:
-            if self.capacity == 0:
-                self.evict_bufferpool()
-            buffer_id = self.disk_page_count
-                #print("adding a buffer id to pool ", buffer_id)
-            self.pool[buffer_id] = [t_name, page, page_key, is_base]
-            self.capacity-=1
-            self.disk_page_count+=1
+        return self.addPages(t_name, page, page_key, is_base)
+
+    def add_to_partition(self, partition, t_name, page, page_key, is_base): #must be called holding partition.thread_lock, returns the buffer_id
+        if self.flusher is None:
+            self.start_flusher()
+        while self.above_quota(t_name, 1) and self.evict_from_partition(partition, t_name): #table at its maximum quota
+            pass
+        while partition.is_full(len(page.data)) and self.evict_from_partition(partition): #also shrinks the partition back once pinned pages made it grow past its budget
+            pass
+        buffer_id = self.next_disk_page()
+            #print("adding a buffer id to pool ", buffer_id)
+        partition.add(buffer_id, t_name, page, page_key, is_base)
             #print(" pages currently in bufferpool: ", list(self.pool.keys()))
+        return buffer_id
 
-    def evict_bufferpool(self):
-        with self.eviction_thread_lock:
-            page_to_evict = list(self.pool.keys())[0]
-            oldest_time = self.pool[page_to_evict][1].timestamp
-            for key in self.pool.keys():
-                page = self.pool[key][1]
-                if (page.pin==0): #select the page that is oldest of all the pages with 0 pins
-                    if (page.timestamp<oldest_time):
-                        page_to_evict = key
-                        oldest_time = page.timestamp
-            #print("removing buffer page: ", page_to_evict)
-            self.write_to_disk(page_to_evict)
-        return
-    
-    def get_page_access(self, t_name, page_key, is_base=True):
-        #print(self.pool.keys())  
-        with self.thread_lock:
+    def evict_bufferpool(self): #evicts one page of the fullest partition, returns False if there was no unpinned page to evict
+        partition = max(self.partitions, key=lambda partition: partition.used - partition.budget)
+        with partition.thread_lock:
+            return self.evict_from_partition(partition)
+
+    def evict_from_partition(self, partition, t_name=None): #must be called holding partition.thread_lock, returns False if every page of the partition is pinned
+        # t_name: only a page of this table is evicted
+        # pages of tables at or below their minimum quota are only evicted when no other unpinned page is left
+        page_to_evict = None
+        oldest_time = None
+        oldest_clean = None # the oldest page already on disk, dropping it doesn't write anything
+        oldest_clean_time = None
+        protected = set() if t_name is not None else set(name for name in list(self.quotas) if self.at_min_quota(name))
+        for skip_protected in (True, False):
+            for key in partition.pool.keys():
+                [name, page] = partition.pool[key][:2]
+                if page.pin!=0 or (t_name is not None and name != t_name):
+                    continue
+                if skip_protected and name in protected:
+                    continue
+                #select the page that is oldest of all the pages with 0 pins
+                if (page_to_evict is None or page.timestamp<oldest_time):
+                    page_to_evict = key
+                    oldest_time = page.timestamp
+                if page.is_dirty==0 and page.num_records!=0 and (oldest_clean is None or page.timestamp<oldest_clean_time):
+                    oldest_clean = key
+                    oldest_clean_time = page.timestamp
+            if page_to_evict is not None or len(protected) == 0:
+                break
+        if page_to_evict is None:
+            return False
+        #print("removing buffer page: ", page_to_evict)
+        if oldest_clean is not None:
+            self.stats["clean_evictions"] += 1
+            self.write_to_disk(partition, oldest_clean)
+        else: #no clean page left, this page fault has to write one and the flusher is behind
+            self.stats["dirty_evictions"] += 1
+            self.flush_event.set()
+            self.write_to_disk(partition, page_to_evict)
+        return True
+
+    def get_page_access(self, t_name, page_key, is_base=True, pin=False, ring=None): #pin: also pins the page before another thread can evict it
+        partition = self.partition(t_name, page_key, is_base)
+        with partition.thread_lock:
             #print("getting page: ", threading.current_thread().name)
-            for key in self.pool.keys():
-                if (self.pool[key][0]==t_name and self.pool[key][2]==page_key and self.pool[key][3]==is_base):
-                    return [self.pool[key][1], key]
+            buffer_id = partition.buffer_ids.get((t_name, page_key, is_base))
+            if buffer_id is not None:
+                page = partition.pool[buffer_id][1]
+                if pin:
+                    page.pin += 1
+                return [page, buffer_id]
+            if ring is not None: #pages missing from the pool are read into the ring and never pinned, buffer_id is None
+                return [self.read_into_ring(ring, t_name, page_key, is_base), None]
             #  load page into bufferpool from disk if it's not currently in bufferpool
-            [page, buffer_id] = self.load_from_disk(t_name, page_key, is_base)
-            return [page, buffer_id]
-    
-    def load_from_disk(self, t_name, page_key, is_base=True): #for a single page
+            [page, buffer_id] = self.load_from_disk(partition, t_name, page_key, is_base)
+            if pin:
+                page.pin += 1
+        self.detect_sequential(t_name, page_key, is_base)
+        return [page, buffer_id]
+
+    def read_into_ring(self, ring, t_name, page_key, is_base=True): #must be called holding the partition lock of the page, which is not in the pool
         table = self.table_access[t_name]
-        if self.capacity==0:
-            self.evict_bufferpool()
-            self.capacity+=1
-        path = ''
-        #print("loadinggggg")
-        if is_base == True:
-            path = table.page_directory[page_key]
-        else: 
-            path = table.tail_page_directory[page_key]
-        f = open(path, "r")
+        path = table.page_directory[page_key] if is_base else table.tail_page_directory[page_key]
+        page = ring.get((t_name, page_key, is_base), path)
+        if page is None:
+            page = self.read_from_disk(t_name, page_key, is_base)
+            ring.add((t_name, page_key, is_base), path, page)
+        return page
+
+    def page_set_size(self, t_name, is_base=True): #physical pages in one base or tail page set of the table
+        return self.table_access[t_name].num_columns + (4 if is_base else 5)
+
+    def detect_sequential(self, t_name, page_key, is_base=True): #called after a page was loaded on demand
+        if self.prefetch_depth == 0:
+            return
+        set_size = self.page_set_size(t_name, is_base)
+        page_set = page_key // set_size
+        last = self.last_miss.get((t_name, is_base))
+        self.last_miss[(t_name, is_base)] = page_set
+        if last is not None and last < page_set <= last + self.prefetch_depth + 1: #moving forward page set by page set, or just past what was prefetched
+            self.prefetch(t_name, [page_key + i*set_size for i in range(1, self.prefetch_depth+1)], is_base)
+
+    """
+    # Asks the prefetch thread to load pages into the pool, e.g. the next pages of a scan
+    # pages already in the pool, already queued or that don't exist are skipped
+    # with a ring the pages are read into the ring instead of the pool
+    """
+    def prefetch(self, t_name, page_keys, is_base=True, ring=None):
+        if self.prefetch_depth == 0:
+            return
+        table = self.table_access[t_name]
+        last_page = table.num_pages if is_base else table.num_tail_pages
+        with self.prefetch_lock:
+            if self.prefetcher is None:
+                self.prefetcher = threading.Thread(target=self.run_prefetcher, daemon=True)
+                self.prefetcher.start()
+            for page_key in page_keys:
+                request = (t_name, page_key, is_base, ring)
+                if page_key > last_page or request in self.prefetching:
+                    continue
+                if (t_name, page_key, is_base) in self.partition(t_name, page_key, is_base).buffer_ids:
+                    continue
+                self.prefetching.add(request)
+                self.prefetch_queue.put(request)
+
+    def run_prefetcher(self):
+        # the page file is read and parsed without the partition latch so lookups of the partition don't wait for the disk,
+        # the page is only installed under the latch if nobody loaded it or wrote a newer file of it meanwhile
+        while True:
+            request = self.prefetch_queue.get()
+            if request is None:
+                return
+            t_name, page_key, is_base, ring = request
+            partition = self.partition(t_name, page_key, is_base)
+            table = self.table_access[t_name]
+            directory = table.page_directory if is_base else table.tail_page_directory
+            key = (t_name, page_key, is_base)
+            path = directory.get(page_key)
+            if key not in partition.buffer_ids and path is not None and (ring is None or ring.get(key, path) is None): #it may have been loaded on demand while it was queued
+                page = self.read_from_disk(t_name, page_key, is_base, path)
+                with partition.thread_lock:
+                    if key not in partition.buffer_ids and directory.get(page_key) == path:
+                        if ring is None:
+                            self.add_to_partition(partition, t_name, page, page_key, is_base)
+                        else:
+                            ring.add(key, path, page)
+                        self.stats["prefetched"] += 1
+            with self.prefetch_lock:
+                self.prefetching.discard(request)
+
+    def stop_prefetcher(self):
+        with self.prefetch_lock:
+            prefetcher = self.prefetcher
+            self.prefetcher = None
+        if prefetcher is not None:
+            while not self.prefetch_queue.empty(): #pages still queued are not needed anymore
+                self.prefetch_queue.get_nowait()
+            self.prefetch_queue.put(None)
+            prefetcher.join()
+        with self.prefetch_lock:
+            self.prefetching.clear()
+
+    def read_from_disk(self, t_name, page_key, is_base=True, path=None): #reads a page file without adding the page to the pool
+        # path: the file to read instead of the one the page directory points to
+        table = self.table_access[t_name]
+        if path is None:
+            if is_base == True:
+                path = table.page_directory[page_key]
+            else:
+                path = table.tail_page_directory[page_key]
         page = Page()
-        self.capacity -= 1
-        lines = f.readlines()
-        page.tps = int(lines[0])
-        for i in range(len(lines)-1):
-            page.write(int(lines[i+1]))
-        self.addPages(t_name, page, page_key, is_base)
-        return [page, self.disk_page_count]
-
-    def write_to_disk(self, page_to_evict): #for a single page
-        buffer_id = page_to_evict
-        t_name = self.pool[buffer_id][0]
+        with open(path, "rb") as f:
+            data = f.read()
+        if compression.is_compressed(data):
+            page.tps, values = compression.decode(data)
+        else:
+            lines = data.split()
+            page.tps = int(lines[0])
+            values = [int(line) for line in lines[1:]]
+        page.write_many(values, 0)
+        page.is_dirty = 0 #same as the file
+        return page
+
+    def load_from_disk(self, partition, t_name, page_key, is_base=True): #for a single page, must be called holding partition.thread_lock
+        #print("loadinggggg")
+        page = self.read_from_disk(t_name, page_key, is_base)
+        buffer_id = self.add_to_partition(partition, t_name, page, page_key, is_base)
+        return [page, buffer_id]
+
+    def write_to_disk(self, partition, page_to_evict): #for a single page, must be called holding partition.thread_lock
+        [t_name, page, page_key, is_base] = partition.remove(page_to_evict)
         #print("evict page ", page_to_evict, " with table name ", t_name)
         table = self.table_access[t_name]
-        page = self.pool[buffer_id][1]
-        page_key = self.pool[buffer_id][2]
         if (page.is_dirty==0 and page.num_records!=0):
-            del self.pool[buffer_id]
-            self.capacity+=1
             return
-        filename = "page"+str(self.disk_page_count)
+        filename = "page"+str(self.next_disk_page()) #every written page gets its own file
         path = os.path.join(table.base_path, filename)
         #print(" writing page ", filename)
-        if self.pool[buffer_id][3] == False:
+        if is_base == False:
             path = os.path.join(table.tail_path, filename)
-        f = open(path, "w")
-        f.write(str(page.tps)+"\n")
-        for i in range(page.num_records):
-            data = page.read_val(i)
-            f.write(str(data)+"\n")
-        f.close()
-        if self.pool[buffer_id][3] == True:
+        self.write_page_file(path, page, self.compression_scheme(t_name, page_key, is_base))
+        if is_base == True:
             table.page_directory[page_key] = path
             #print("path to evicted page: ", table.page_directory[page_key])
         else:
             table.tail_page_directory[page_key] = path
             #print("path to evicted page: ", table.tail_page_directory[page_key])
-        del self.pool[buffer_id]
-        self.capacity+=1
-
-    def updatePool(self, buffer_id, page):
-        # Update an existing page in the buffer pool and mark it as dirty
-        self.pool[buffer_id] = page
-        
-    def get_page(self, t_name, page_key, is_base=True):
-        page = self.get_page_access(t_name, page_key, is_base)[0]
-        return page
-    
-    def get_page_copy(self, t_name, page_key, is_base=True):
-        for key in self.pool.keys():
-            if (self.pool[key][0]==t_name and self.pool[key][2]==page_key and self.pool[key][3]==is_base):
-                return self.pool[key][1]
-        #  load page from disk if it's not currently in bufferpool
+
+    def start_flusher(self):
+        self.flusher = threading.Thread(target=self.run_flusher, daemon=True)
+        self.flusher.start()
+
+    def stop_flusher(self):
+        if self.flusher is not None:
+            flusher = self.flusher
+            self.flusher = False #tells the flusher to stop
+            self.flush_event.set()
+            flusher.join()
+        self.flusher = None
+
+    def run_flusher(self):
+        while True:
+            self.flush_event.wait(self.flush_interval)
+            woken = self.flush_event.is_set()
+            self.flush_event.clear()
+            if self.flusher is False:
+                return
+            dirty = self.count_dirty_pages()
+            target = int(self.dirty_ratio*self.capacity/2) #dirty pages left once the flusher is done
+            if dirty > self.dirty_ratio*self.capacity:
+                self.flush_dirty_pages(dirty - target)
+            elif woken: #a partition ran out of clean pages before the whole pool crossed the ratio
+                self.flush_dirty_pages(target)
+
+    def count_dirty_pages(self):
+        dirty = 0
+        for partition in self.partitions:
+            with partition.thread_lock:
+                for entry in partition.pool.values():
+                    dirty += entry[1].is_dirty
+        return dirty
+
+    """
+    # Writes up to count dirty and unpinned pages to disk, oldest first, the pages stay in the pool as clean pages
+    # Returns the number of pages written
+    """
+    def flush_dirty_pages(self, count):
+        candidates = [] # (timestamp, partition, buffer_id)
+        for partition in self.partitions:
+            with partition.thread_lock:
+                for buffer_id, entry in partition.pool.items():
+                    if entry[1].is_dirty==1 and entry[1].pin==0:
+                        candidates.append((entry[1].timestamp, partition, buffer_id))
+        candidates.sort(key=lambda candidate: candidate[0])
+        flushed = 0
+        for timestamp, partition, buffer_id in candidates[:max(count, 0)]:
+            if self.flush_page(partition, buffer_id):
+                flushed += 1
+        self.stats["flushed"] += flushed
+        return flushed
+
+    def flush_page(self, partition, buffer_id): #writes one page to a new file without evicting it
+        with partition.thread_lock:
+            entry = partition.pool.get(buffer_id)
+            if entry is None or entry[1].is_dirty==0 or entry[1].pin!=0: #evicted, cleaned or being used since it was picked
+                return False
+            t_name, page, page_key, is_base = entry
+            # no thread is using the page (taking a pin needs the partition lock), so the copy holds every write made so far
+            # writes made while the copy is on its way to disk mark the page dirty again
+            page.is_dirty = 0
+            data = page.copy()
+            page.pin += 1 #keeps the page in the pool until the page directory points to the new file
         table = self.table_access[t_name]
-        path = ''
-        if is_base == True:
-            path = table.page_directory[page_key]
-        else: 
-            path = table.tail_page_directory[page_key]
-        f = open(path, "r")
-        page = Page()
-        lines = f.readlines()
-        page.tps = int(lines[0])
-        for i in range(len(lines)-1):
-            page.write(int(lines[i+1]))
+        filename = "page"+str(self.next_disk_page())
+        path = os.path.join(table.base_path if is_base else table.tail_path, filename)
+        self.write_page_file(path, data, self.compression_scheme(t_name, page_key, is_base))
+        with partition.thread_lock:
+            if is_base == True:
+                table.page_directory[page_key] = path
+            else:
+                table.tail_page_directory[page_key] = path
+            page.pin -= 1
+        return True
+
+    def compression_scheme(self, t_name, page_key, is_base=True): #scheme the file of a page is compressed with, None for pages that stay plain text
+        table = self.table_access[t_name]
+        column = page_key % (table.num_columns+4) - 4
+        if not is_base or column < 0: #tail pages and the indirection, rid, timestamp and schema encoding pages keep changing
+            return None
+        return getattr(table, 'compression', {}).get(column)
+
+    def write_page_file(self, path, page, scheme=None): #only full pages are compressed, a page still being filled is written again soon
+        if scheme is not None and page.num_records == page.max_records:
+            with open(path, "wb") as f:
+                f.write(compression.encode(page.tps, page.read_all(), scheme))
+            self.stats["compressed"] += 1
+            return
+        with open(path, "w") as f:
+            f.write(str(page.tps)+"\n")
+            for i in range(page.num_records):
+                data = page.read_val(i)
+                f.write(str(data)+"\n")
+
+    def get_page(self, t_name, page_key, is_base=True, ring=None): #the page may be evicted as soon as it is returned, pages that are written to must be pinned
+        page = self.get_page_access(t_name, page_key, is_base, False, ring)[0] #with a ring, a page missing from the pool is read into the ring instead
         return page
 
-    def get_tail_pages(self, table_name):
+    def pin_page(self, t_name, page_key, is_base=True): #same as get_page but the page stays in the pool until unpin_page is called
+        return self.get_page_access(t_name, page_key, is_base, True)[0]
+
+    def unpin_page(self, t_name, page_key, is_base=True):
+        partition = self.partition(t_name, page_key, is_base)
+        with partition.thread_lock:
+            partition.pool[partition.buffer_ids[(t_name, page_key, is_base)]][1].pin -= 1
+
+    """
+    # Pins a page for the duration of a with block:
+    #   with bufferpool.pinned_page(t_name, page_key, is_base) as page:
+    #       page.write(value, rid)
+    """
+    @contextmanager
+    def pinned_page(self, t_name, page_key, is_base=True):
+        page = self.pin_page(t_name, page_key, is_base)
+        try:
+            yield page
+        finally:
+            self.unpin_page(t_name, page_key, is_base)
+
+    def get_page_copy(self, t_name, page_key, is_base=True): #returns a private copy of a page, a page missing from the pool is read without adding it to the pool
+        partition = self.partition(t_name, page_key, is_base)
+        with partition.thread_lock:
+            buffer_id = partition.buffer_ids.get((t_name, page_key, is_base))
+            if buffer_id is not None:
+                return partition.pool[buffer_id][1].copy()
+            #  read page from disk if it's not currently in bufferpool, nobody else holds it
+            return self.read_from_disk(t_name, page_key, is_base)
+
+    def get_tail_pages(self, table_name): #the tail pages that are not merged yet, read through a ring so the merge doesn't fill the pool with them
         tail_pages = {}
         table = self.table_access[table_name]
+        ring = RingBuffer(table.num_columns+5)
         tail_page_start = (table.tps//table.max_records)*(table.num_columns+5)
         for page_key in range(tail_page_start, table.num_tail_pages+1):
-            tail_pages[page_key] = self.get_page_copy(table_name, page_key, is_base=False)
+            tail_pages[page_key] = self.get_page(table_name, page_key, False, ring)
         return tail_pages
 
+    """
+    # Installs a new version of a base page (e.g. a merged copy from get_page_copy) in the pool
+    # the page is dirty and reaches disk through the flusher or its eviction like every other written page
+    # waits for the queries using the old version to unpin it, so no write to the old version is lost after the swap
+    """
     def replace_page(self, table_name, page_key, page):
-        table = self.table_access[table_name]
-        for key in self.pool.keys():
-            if (self.pool[key][0]==table_name and self.pool[key][2]==page_key and self.pool[key][3]==True):
-                page.is_dirty = 1
-                self.pool[key][1] = page
-        if page_key in table.page_directory:
-            path = table.page_directory[page_key]
-            f = open(path, 'w').close() #erases the current contents of the file
-            f = open(path, 'w')
-            f.write(str(page.tps)+"\n")
-            for i in range(page.num_records):
-                data = page.read_val(i)
-                f.write(str(data)+"\n")
-            f.close()
-        pass
+        partition = self.partition(table_name, page_key, True)
+        while True:
+            with partition.thread_lock:
+                buffer_id = partition.buffer_ids.get((table_name, page_key, True))
+                if buffer_id is None:
+                    page.is_dirty = 1
+                    self.add_to_partition(partition, table_name, page, page_key, True)
+                    return
+                if partition.pool[buffer_id][1].pin == 0:
+                    page.is_dirty = 1
+                    partition.replace(buffer_id, page)
+                    return
+            time.sleep(0.0001)
 
 
     def save(self):
@@ -203,13 +574,15 @@ class BufferPool:
             pickle.dump(self, f) #dump all metadata, pagedirectory, and index
 
     def close(self):
-        numkeys=0
-        for key in self.pool.keys():
-            numkeys+=1
-        for i in range(numkeys):
-            self.evict_bufferpool()
-            self.disk_page_count+=1
-        self.pool.clear()
+        self.stop_prefetcher()
+        self.stop_flusher()
+        for partition in self.partitions:
+            with partition.thread_lock:
+                while len(partition.pool) != 0 and self.evict_from_partition(partition):
+                    pass
+                partition.pool.clear()
+                partition.buffer_ids.clear()
+                partition.used = 0
         filename = "bufferpool.pickle"
         path = os.path.join(self.parent_path, filename)
         for key in self.table_access.keys():
@@ -219,16 +592,17 @@ class BufferPool:
             self.table_access[key].merge_thread_lock = None
             self.table_access[key].index.thread_lock = None
             self.table_access[key].index.createIndex_thread_lock = None
-        
+
     def open(self):
         filename = "bufferpool.pickle"
         path = os.path.join(self.parent_path, filename)
         bp = BufferPool(self.parent_path)
         with open(path, 'rb') as f:
-            bp = pickle.load(f)   
-        capacity = bp.capacity
-        self.capacity = capacity  
+            bp = pickle.load(f)
+        self.num_partitions = getattr(bp, 'num_partitions', self.num_partitions)
+        self.quotas = getattr(bp, 'quotas', {})
+        self.init_partitions() #the memory budget stays the one this pool was created or resized with
         disk_page_count = bp.disk_page_count
-        self.disk_page_count = disk_page_count 
-        #print(self.pool.keys())  
-        #print(bp.pool.keys())     
\ No newline at end of file
+        self.disk_page_count = disk_page_count
+        #print(self.pool.keys())
+        #print(bp.pool.keys())
@@ -0,0 +1,74 @@
+from lstore.query import Query
+from lstore.transaction_pool import get_shared_pool
+import asyncio
+import functools
+
+class AsyncQuery:
+    """
+    # asyncio front-end of Query: every query runs on an executor thread so page reads from disk don't block the event loop
+    # the coroutines return the same values as the matching Query methods
+    :param table: Table
+    :param executor: concurrent.futures.Executor   #None uses the event loop's default executor
+    """
+    def __init__(self, table, executor=None):
+        self.table = table
+        self.query = Query(table)
+        self.executor = executor
+
+    async def __run(self, method, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args))
+
+    async def delete(self, primary_key):
+        return await self.__run(self.query.delete, primary_key)
+
+    async def insert(self, *columns):
+        return await self.__run(self.query.insert, *columns)
+
+    async def insert_many(self, rows):
+        return await self.__run(self.query.insert_many, rows)
+
+    async def select(self, search_key, search_key_index, projected_columns_index):
+        return await self.__run(self.query.select, search_key, search_key_index, projected_columns_index)
+
+    async def select_version(self, search_key, search_key_index, projected_columns_index, relative_version):
+        return await self.__run(self.query.select_version, search_key, search_key_index, projected_columns_index, relative_version)
+
+    async def select_as_of(self, search_key, search_key_index, projected_columns_index, timestamp):
+        return await self.__run(self.query.select_as_of, search_key, search_key_index, projected_columns_index, timestamp)
+
+    async def select_many(self, search_keys, search_key_index, projected_columns_index):
+        return await self.__run(self.query.select_many, search_keys, search_key_index, projected_columns_index)
+
+    async def scan(self, predicate, projected_columns_index): #returns the list of records Query.scan yields, the whole scan runs on the executor
+        return await self.__run(lambda: list(self.query.scan(predicate, projected_columns_index)))
+
+    async def update(self, key, *columns):
+        return await self.__run(self.query.update, key, *columns)
+
+    async def update_many(self, updates):
+        return await self.__run(self.query.update_many, updates)
+
+    async def sum(self, start, end, column_index):
+        return await self.__run(self.query.sum, start, end, column_index)
+
+    async def sum_version(self, start, end, column_index, version_num):
+        return await self.__run(self.query.sum_version, start, end, column_index, version_num)
+
+    async def sum_as_of(self, start, end, column_index, timestamp):
+        return await self.__run(self.query.sum_as_of, start, end, column_index, timestamp)
+
+    async def aggregate(self, function, column, start=None, end=None, predicate=None, group_by=None, relative_version=0):
+        return await self.__run(self.query.aggregate, function, column, start, end, predicate, group_by, relative_version)
+
+    async def increment(self, key, column):
+        return await self.__run(self.query.increment, key, column)
+
+"""
+# Runs a Transaction on a TransactionPool (the shared pool if none is given)
+# Returns True once it commits, or False if the pool gave up on it
+"""
+async def run_transaction(transaction, pool=None):
+    if pool is None:
+        pool = get_shared_pool()
+    return await asyncio.wrap_future(pool.submit(transaction))
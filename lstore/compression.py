@@ -0,0 +1,96 @@
+import struct
+
+#Compressed page files hold the values of one full base page of a data column:
+#   MAGIC, tps (8 bytes), number of values (2 bytes), scheme id (1 byte), then the payload of the scheme
+#plain page files are text (tps then one value per line), they never start with MAGIC
+
+MAGIC = b'LSC1'
+HEADER = struct.Struct('<qHB')
+SCHEMES = ('bitpack', 'for', 'delta', 'rle', 'auto') #'auto' writes each page with whichever scheme makes it smallest
+
+def zigzag(value): #maps signed ints to unsigned ones, small negative values stay small: 0, -1, 1, -2 -> 0, 1, 2, 3
+    return (value << 1) ^ (value >> 63)
+
+def unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+def pack_bits(values, unsigned=False): #every value takes as many bits as the largest one, the width is the first byte
+    if not unsigned:
+        values = [zigzag(value) for value in values]
+    width = max(values, default=0).bit_length()
+    packed = 0
+    for i, value in enumerate(values):
+        packed |= value << (i*width)
+    return bytes([width]) + packed.to_bytes((len(values)*width + 7)//8, 'little')
+
+def unpack_bits(data, count, unsigned=False):
+    width = data[0]
+    packed = int.from_bytes(data[1:], 'little')
+    mask = (1 << width) - 1
+    values = [(packed >> (i*width)) & mask for i in range(count)]
+    if not unsigned:
+        values = [unzigzag(value) for value in values]
+    return values
+
+def encode_bitpack(values):
+    return pack_bits(values)
+
+def decode_bitpack(data, count):
+    return unpack_bits(data, count)
+
+def encode_for(values): #frame of reference: the smallest value, then the distance of every value to it
+    base = min(values)
+    return struct.pack('<q', base) + pack_bits([value - base for value in values], True)
+
+def decode_for(data, count):
+    base = struct.unpack_from('<q', data)[0]
+    return [base + value for value in unpack_bits(data[8:], count, True)]
+
+def encode_delta(values): #the first value, then the difference between each value and the one before
+    return struct.pack('<q', values[0]) + pack_bits([values[i] - values[i-1] for i in range(1, len(values))])
+
+def decode_delta(data, count):
+    values = [struct.unpack_from('<q', data)[0]]
+    for delta in unpack_bits(data[8:], count - 1):
+        values.append(values[-1] + delta)
+    return values
+
+def encode_rle(values): #number of runs of equal values, the length of each run, then the value of each run
+    runs = []
+    for value in values:
+        if runs and runs[-1][0] == value and runs[-1][1] < 255:
+            runs[-1][1] += 1
+        else:
+            runs.append([value, 1])
+    return struct.pack('<H', len(runs)) + bytes(run[1] for run in runs) + pack_bits([run[0] for run in runs])
+
+def decode_rle(data, count):
+    num_runs = struct.unpack_from('<H', data)[0]
+    lengths = data[2:2+num_runs]
+    values = []
+    for value, length in zip(unpack_bits(data[2+num_runs:], num_runs), lengths):
+        values.extend([value]*length)
+    return values
+
+ENCODERS = {'bitpack': encode_bitpack, 'for': encode_for, 'delta': encode_delta, 'rle': encode_rle}
+DECODERS = {'bitpack': decode_bitpack, 'for': decode_for, 'delta': decode_delta, 'rle': decode_rle}
+SCHEME_IDS = ('bitpack', 'for', 'delta', 'rle') #position is the id stored in the header
+
+"""
+# Returns the bytes of a compressed page file holding values
+:param tps: int
+:param values: list of ints    #not empty
+:param scheme: string          #one of SCHEMES
+"""
+def encode(tps, values, scheme):
+    if scheme == 'auto':
+        payloads = [(len(ENCODERS[name](values)), name) for name in SCHEME_IDS]
+        scheme = min(payloads)[1]
+    return MAGIC + HEADER.pack(tps, len(values), SCHEME_IDS.index(scheme)) + ENCODERS[scheme](values)
+
+def is_compressed(data):
+    return data[:len(MAGIC)] == MAGIC
+
+def decode(data): #returns (tps, values) of a compressed page file
+    tps, count, scheme_id = HEADER.unpack_from(data, len(MAGIC))
+    return tps, DECODERS[SCHEME_IDS[scheme_id]](data[len(MAGIC)+HEADER.size:], count)
@@ -7,13 +7,15 @@ import threading
 import shutil
 
 class Database():
-
-    def __init__(self):
+    """
+    :param memory_budget: int      #bytes the bufferpool may use for pages, None keeps the default; can be changed later with bufferpool.resize
+    """
+    def __init__(self, memory_budget=None):
         self.path = ''
         self.tables = {}
         self.table_paths = {}
         self.table_columns = {}
-        self.bufferpool = BufferPool()
+        self.bufferpool = BufferPool() if memory_budget is None else BufferPool(memory_budget=memory_budget)
         pass
 
     # Not required for milestone1
@@ -44,7 +46,7 @@ class Database():
                 table = Table(file, num_columns, 0, path, self.bufferpool, "load")
                 table.open()
                 table.bufferpool = self.bufferpool
-                table.lock_manager = LockManager()
+                table.lock_manager = LockManager(table.max_records)
                 table.thread_lock = threading.Lock()
                 table.update_thread_lock = threading.Lock()
                 table.merge_thread_lock = threading.Lock()
@@ -56,9 +58,7 @@ class Database():
 
     def close(self):
         self.bufferpool.close()
-        self.bufferpool.thread_lock = None
-        self.bufferpool.eviction_thread_lock = None
-        self.bufferpool.save()
+        self.bufferpool.save() #the bufferpool pickles without its locks
         for key in self.tables.keys():
             self.tables[key].lock_manager = None
             self.tables[key].thread_lock = None
@@ -78,15 +78,21 @@ class Database():
     :param name: string         #Table name
     :param num_columns: int     #Number of Columns: all columns are integer
     :param key: int             #Index of table key in columns
+    :param cumulative: bool     #tail records copy every column (True) or only hold the updated columns (False)
+    :param min_pages: int       #pages of the table the bufferpool keeps before evicting them for other tables
+    :param max_pages: int       #most pages of the table in the bufferpool, None means no maximum
+    :param compression: dict    #key: data column, value: scheme ('bitpack', 'for', 'delta', 'rle' or 'auto') its full base pages are compressed with on disk
     """
-    def create_table(self, name, num_columns, key_index):
+    def create_table(self, name, num_columns, key_index, cumulative=True, min_pages=0, max_pages=None, compression=None):
         parent_dir = self.path
         directory = name
         path = os.path.join(parent_dir, directory)
         if not os.path.exists(path):
             os.makedirs(path)
         self.table_paths[name] = path
-        table = Table(name, num_columns, key_index, path, self.bufferpool)
+        table = Table(name, num_columns, key_index, path, self.bufferpool, cumulative=cumulative, compression=compression)
+        if min_pages != 0 or max_pages is not None:
+            self.bufferpool.set_quota(name, min_pages, max_pages)
         self.tables[name] = table
         self.table_columns[name] = num_columns
         return table
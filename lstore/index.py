@@ -1,16 +1,19 @@
 import threading
+from lstore.Bufferpool import RingBuffer
 
 class Index:
     def __init__(self, table):
         # Correctly initialize an empty dictionary for each column's index
         self.table = table  # Reference to the table
         self.indices = [None] *  table.num_columns
+        self.removed = [{} for i in range(table.num_columns)] #entries deleted from each index, kept so snapshot and as_of reads still find the older versions of records (readers check the value of the version they read)
         self.thread_lock = threading.Lock()
         self.createIndex_thread_lock = threading.Lock()
 
 
-    def locate(self, column, value):
+    def locate(self, column, value, removed=False):
         # Return RIDs for records matching value in column
+        # removed: also return the RIDs whose entry was deleted, for reads that may see an older version
         #print("I am waiting for ", threading.current_thread().name)
         key_list = []
         with self.thread_lock:
@@ -22,14 +25,44 @@ class Index:
                 self.drop_index(column)
             else:
                 key_list = list(self.indices[column].get(value, []))
+                if removed:
+                    key_list += list(self.removed[column].get(value, []))
         return key_list
 
-    def locate_range(self, column, begin, end):
+    def locate_many(self, column, values, removed=False):
+        # Return the list of RIDs matching each value in column, taking the lock once
+        with self.thread_lock:
+            if self.indices[column] is None:
+                self.create_index(column)
+                key_lists = [list(self.indices[column].get(value, [])) for value in values]
+                self.drop_index(column)
+            else:
+                key_lists = [list(self.indices[column].get(value, [])) for value in values]
+                if removed:
+                    key_lists = [key_lists[i] + list(self.removed[column].get(values[i], [])) for i in range(len(values))]
+        return key_lists
+
+    def locate_range(self, column, begin, end, removed=False):
         # Return RIDs for records within range [begin, end] in column
         with self.thread_lock:
             if self.indices[column] is None:
                 raise ValueError(f"No index found for column {column}.")
-            return [rid for key, rids in self.indices[column].items() if key is not None and (begin is None or begin <= key) and (end is None or key <= end) for rid in rids]
+            entries = [self.indices[column], self.removed[column]] if removed else [self.indices[column]]
+            return [rid for index in entries for key, rids in index.items() if key is not None and (begin is None or begin <= key) and (end is None or key <= end) for rid in rids]
+
+    def iter_range(self, column, begin, end, removed=False):
+        # Yield (key, rid) pairs for records within range [begin, end] in column, in key order
+        # only the matching keys are copied up front, the rids of each key are copied when the key is reached
+        with self.thread_lock:
+            if self.indices[column] is None:
+                raise ValueError(f"No index found for column {column}.")
+            entries = [self.indices[column], self.removed[column]] if removed else [self.indices[column]]
+            keys = sorted(set(key for index in entries for key in index if key is not None and (begin is None or begin <= key) and (end is None or key <= end)))
+        for key in keys:
+            with self.thread_lock:
+                rids = [rid for index in entries for rid in index.get(key, [])]
+            for rid in rids:
+                yield (key, rid)
 
     def remove_index(self, column, value, rid):
         with self.thread_lock:
@@ -47,6 +80,24 @@ class Index:
             if key not in self.indices[column]:
                 self.indices[column][key] = set()
             self.indices[column][key].add(rid)
+            self.forget_removed(column, key, rid)
+
+    def add_many(self, column, keys, rids):
+        # Adds one index entry per (key, rid) pair taking the lock once
+        with self.thread_lock:
+            self.create_index(column)
+            index = self.indices[column]
+            for key, rid in zip(keys, rids):
+                if key not in index:
+                    index[key] = set()
+                index[key].add(rid)
+                self.forget_removed(column, key, rid)
+
+    def forget_removed(self, column, key, rid): #the entry is back in the index, must be called holding self.thread_lock
+        if key in self.removed[column]:
+            self.removed[column][key].discard(rid)
+            if not self.removed[column][key]:
+                del self.removed[column][key]
 
     def update_index(self, column, key, old_rid, new_rid):
         # Ensure the column has an index before updating
@@ -68,24 +119,30 @@ class Index:
                 self.indices[column][key].discard(rid)
                 if not self.indices[column][key]:  # If set is empty after deletion
                     del self.indices[column][key]
+                if key not in self.removed[column]:
+                    self.removed[column][key] = set()
+                self.removed[column][key].add(rid)
 
     def create_index(self, column_number):
         # Create an index for a specific column by scanning all records
+        # entries are added to the new dictionary directly so this can be called while holding self.thread_lock
         with self.createIndex_thread_lock:
             #print("Is this the problem: ", threading.current_thread().name)
             if self.indices[column_number] is None:
-                self.indices[column_number] = {}
+                index = {}
                 num_records = self.table.rid
                 max_records = self.table.max_records #max_records per page
-                for i in range (num_records//max_records):
-                    page = self.table.bufferpool.get_page_copy(self.table.name, i*(4+self.table.num_columns)+(4+column_number)).copy()
-                    for j in range(page.num_records):
-                        self.add_index(column_number, page.read_val(j), i*(4+self.table.num_columns)+j)
-                if (num_records%max_records!=0):
-                    i = num_records//max_records
-                    page = self.table.bufferpool.get_page_copy(self.table.name, i*(4+self.table.num_columns)+(4+column_number)).copy()
+                page_set_size = 4+self.table.num_columns
+                ring = RingBuffer(max(32, 2*self.table.bufferpool.prefetch_depth)) #pages that are not in the bufferpool are read through a few frames of their own
+                for i in range((num_records + max_records - 1)//max_records):
+                    self.table.bufferpool.prefetch(self.table.name, [j*page_set_size+(4+column_number) for j in range(i+1, i+1+self.table.bufferpool.prefetch_depth)], True, ring) #pages past the last one are skipped
+                    page = self.table.bufferpool.get_page(self.table.name, i*page_set_size+(4+column_number), True, ring)
                     for j in range(page.num_records):
-                        self.add_index(column_number, page.read_val(j), i*(4+self.table.num_columns)+j)
+                        key = page.read_val(j)
+                        if key not in index:
+                            index[key] = set()
+                        index[key].add(i*max_records+j)
+                self.indices[column_number] = index
             return
 
 
@@ -94,4 +151,5 @@ class Index:
         # Drop an index for a specific column
         with self.createIndex_thread_lock:
             if self.indices[column_number] is not None:
-                self.indices[column_number] = None
\ No newline at end of file
+                self.indices[column_number] = None
+                self.removed[column_number] = {}
\ No newline at end of file
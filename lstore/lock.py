@@ -1,142 +1,130 @@
 import threading
 
+#resources of the lock hierarchy: the table, the page ranges of the table (one base page set each), and the records (locked by rid)
+#the dynamic-state resource sits under the table and stands for the set of records that could be inserted (guards scans against phantoms)
+TABLE = "table"
+DYNAMIC_STATE = "dynamic-state"
+
+#multi-granularity lock modes (intention shared, intention exclusive, shared, shared + intention exclusive, exclusive)
+IS = 'IS'
+IX = 'IX'
+S = 'S'
+SIX = 'SIX'
+X = 'X'
+
+COMPATIBLE = { # key: requested mode, value: modes other transactions may hold at the same time
+    IS: {IS, IX, S, SIX},
+    IX: {IS, IX},
+    S: {IS, S},
+    SIX: {IS},
+    X: set(),
+}
+
+STRENGTH = {IS: 0, IX: 1, S: 1, SIX: 2, X: 3}
+
+def combine_modes(held, requested): #returns the weakest mode that covers both modes (used when a transaction upgrades a lock it already holds)
+    if held is None or held == requested:
+        return requested
+    if {held, requested} == {IX, S}:
+        return SIX
+    if STRENGTH[held] >= STRENGTH[requested]:
+        return held
+    return requested
+
 class LockManager:
-    def __init__(self):
-        self.locks = {} # key: rid, value: lock
+    def __init__(self, max_records=64):
+        self.locks = {} # key: resource (TABLE, DYNAMIC_STATE, ("range", page_range) or rid), value: lock
+        self.max_records = max_records #records per page range, this MUST mirror max_records from the table class
         self.thread_lock = threading.Lock() #this variable captures whichever thread accesses this LockManager object first (removing race condition to acquire the locks)
 
+    def page_range(self, rid):
+        return ("range", rid // self.max_records)
+
+    """
+    acquires every (resource, mode) pair in requests or none of them
+    returns the list of granted (resource, mode) pairs, or False if any of them conflicts with another transaction
+    """
+    def acquire_locks(self, requests, t_id):
+        with self.thread_lock:
+            for resource, mode in requests:
+                if resource in self.locks and not self.locks[resource].is_compatible(mode, t_id):
+                    return False
+            for resource, mode in requests:
+                if resource not in self.locks:
+                    self.locks[resource] = Lock()
+                self.locks[resource].grant(mode, t_id)
+            return requests
+
     """
     parameters:
     rid_list - list of rid's to acquire read locks
     """
     def acquire_read_locks(self, rid_list, t_id=None):
-        with self.thread_lock:
-            if "table" in self.locks:
-                return False
-            for rid in rid_list:
-                if rid not in self.locks:
-                    self.locks[rid] = Lock()
-                return self.locks[rid].get_shared_lock(t_id)
-                #print("rid: ", rid, "read_count", self.locks[rid].read_count)
-            return True
+        if t_id == None: #nothing can be tracked or released without a transaction id, queries run outside transactions don't lock
+            return []
+        requests = [(TABLE, IS)]
+        for page_range in dict.fromkeys(self.page_range(rid) for rid in rid_list):
+            requests.append((page_range, IS))
+        for rid in rid_list:
+            requests.append((rid, S))
+        return self.acquire_locks(requests, t_id)
 
     def acquire_exclusive_lock(self, rid, t_id=None):
-        with self.thread_lock:
-            #print("t id is ", t_id)
-            if "table" in self.locks:
-                return False
-            if rid not in self.locks:
-                self.locks[rid] = Lock()
-            return self.locks[rid].get_exclusive_lock(t_id)
+        if t_id == None:
+            return []
+        return self.acquire_locks([(TABLE, IX), (self.page_range(rid), IX), (rid, X)], t_id)
 
+    def acquire_exclusive_locks(self, rid_list, t_id=None): #X on every record of rid_list, or on none of them
+        if t_id == None:
+            return []
+        requests = [(TABLE, IX)]
+        for page_range in dict.fromkeys(self.page_range(rid) for rid in rid_list):
+            requests.append((page_range, IX))
+        for rid in dict.fromkeys(rid_list):
+            requests.append((rid, X))
+        return self.acquire_locks(requests, t_id)
 
-    def acquire_table_lock(self, t_id):
-        with self.thread_lock:
-            check_compatibility = True #checks whetehr the other locks existing are of the same transaction
-            for lock in self.locks:
-                for i in self.locks[lock].transaction_ids:
-                    if i != t_id:
-                        #print("table lock blocked by ", i, self.locks[lock].transaction_ids)
-                        check_compatibility = False
-            if check_compatibility == False:
-                return False
-            #print("acquiring table lock ")
-            self.locks["table"] = Lock()
-            return self.locks["table"].get_exclusive_lock(t_id)
+    """
+    locks the page ranges holding rid_list for a scan (e.g. sum over a key range)
+    point updates to records of other page ranges can still run concurrently, inserts wait since they could add records to the scanned key range
+    """
+    def acquire_range_locks(self, rid_list, t_id=None):
+        if t_id == None:
+            return []
+        requests = [(TABLE, IS), (DYNAMIC_STATE, S)]
+        for page_range in dict.fromkeys(self.page_range(rid) for rid in rid_list):
+            requests.append((page_range, S))
+        return self.acquire_locks(requests, t_id)
 
-    def block_table_lock(self, t_id):
-        with self.thread_lock:
-            if "table" in self.locks:
-                return False
-            else:
-                if "dynamic-state" not in self.locks:
-                    self.locks["dynamic-state"] = Lock()
-                return self.locks["dynamic-state"].get_shared_lock(t_id) #get a shared lock so other transactions that are inserting can also do so, this lock is to simply stop scanning operations
+    def acquire_insert_lock(self, t_id=None):
+        if t_id == None:
+            return []
+        return self.acquire_locks([(TABLE, IX), (DYNAMIC_STATE, IX)], t_id) #inserting transactions are compatible with each other, this lock is to simply stop scanning operations
 
     def release_all_locks(self, held_locks, t_id):
-        #print("release locks", t_id)
         with self.thread_lock:
-            for rid, locks in held_locks.items():
-                # print("rid: ", rid, " locks: ", locks)
-                for lock in locks:
-                    if lock == 'r':
-                        if rid in self.locks:
-                            self.locks[rid].release_shared_lock(t_id)
-                            if len(self.locks[rid].transaction_ids) == 0:
-                                del self.locks[rid]
-                    elif lock == 'w':
-                        if rid in self.locks:
-                            self.locks[rid].release_exclusive_lock(t_id)
-                            if len(self.locks[rid].transaction_ids) == 0:
-                                del self.locks[rid]
-        #print(self.locks)
+            for resource in held_locks:
+                if resource in self.locks:
+                    self.locks[resource].release(t_id)
+                    if len(self.locks[resource].holders) == 0:
+                        del self.locks[resource]
 
 class Lock:
     def __init__(self):
-        self.read_count = 0
-        self.write_count = 0
-        self.transaction_ids = []
-
-    # read-lock: other transactions can only read but not write
-    def get_shared_lock(self, t_id=None): #read lock
-        if self.write_count == 0:
-            self.read_count += 1
-            if t_id!=None:
-                self.transaction_ids.append(t_id)
-            return True
-        
-        check_compatibility = True #check if t_id currently holds an X on this lock
-        for i in self.transaction_ids:
-            if i != t_id:
-                check_compatibility = False
-        if check_compatibility == True:
-            self.read_count += 1
-            if t_id!=None:
-                self.transaction_ids.append(t_id)
-            return True
-        return False
+        self.holders = {} # key: transaction id, value: strongest mode held by that transaction
 
-    # write-lock: other transactions cannot read or write
-    def get_exclusive_lock(self, t_id=None):
-        if self.read_count == 0 and self.write_count == 0:
-            self.write_count += 1
-            #print("I have acquired an x lock ", t_id)
-            if t_id!=None:
-                self.transaction_ids.append(t_id)
-            return True
-        
-        if t_id == None: #nothingmore can be done without knowing a transaction id :(
-            return False
-        
-        check_compatibility = True #check if t_id currently holds an S or X lock and can be upgraded to an X lock (no other transactions are holding this lock)
-        for i in self.transaction_ids:
-            if i != t_id:
-                check_compatibility = False
-        if check_compatibility == True:
-            self.write_count += 1
-            if t_id!=None:
-                self.transaction_ids.append(t_id)
-            return True
-        return check_compatibility
-
-    def release_shared_lock(self, t_id=None):
-        if self.read_count > 0:
-            self.read_count -= 1
-            if t_id!=None:
-                try:
-                    self.transaction_ids.remove(t_id)
-                except ValueError:
-                    pass
-            return True
-        return False
+    def is_compatible(self, mode, t_id):
+        mode = combine_modes(self.holders.get(t_id), mode)
+        for holder, held in self.holders.items():
+            if holder != t_id and held not in COMPATIBLE[mode]:
+                return False
+        return True
 
-    def release_exclusive_lock(self, t_id=None):
-        if self.write_count > 0:
-            self.write_count -= 1
-            if t_id!=None:
-                try:
-                    self.transaction_ids.remove(t_id)
-                except ValueError:
-                    pass
+    def grant(self, mode, t_id):
+        self.holders[t_id] = combine_modes(self.holders.get(t_id), mode)
+
+    def release(self, t_id):
+        if t_id in self.holders:
+            del self.holders[t_id]
             return True
-        return False
\ No newline at end of file
+        return False
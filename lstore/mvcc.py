@@ -0,0 +1,102 @@
+import threading
+
+#Timestamps written into the TIMESTAMP_COLUMN of base and tail records:
+#   >= 0 : commit timestamp taken from the logical clock below (0 for records written before timestamps existed)
+#   <  0 : written by a transaction that has not committed yet, stored as -(t_id+1)
+
+class Clock: #logical clock shared by every table, one tick per commit
+    def __init__(self):
+        self.time = 0
+        self.thread_lock = threading.Lock() #also held while a transaction stamps its writes so a snapshot never sees half of a commit
+
+    def now(self):
+        with self.thread_lock:
+            return self.time
+
+    def tick(self):
+        with self.thread_lock:
+            self.time += 1
+            return self.time
+
+    def advance(self, time): #called when tables are reopened so new commits are ordered after the stored ones
+        with self.thread_lock:
+            if time > self.time:
+                self.time = time
+
+clock = Clock()
+context = threading.local() #transaction running on the current thread (t_id, snapshot timestamp and written records)
+
+def uncommitted_timestamp(t_id):
+    return -(t_id+1)
+
+"""
+# Starts the transaction t_id on the current thread
+# with use_snapshot every read done by this thread sees the versions committed before this point plus its own writes,
+# otherwise reads see the latest version (the caller is expected to lock what it reads)
+"""
+def begin(t_id, use_snapshot=True):
+    context.t_id = t_id
+    context.snapshot = clock.now() if use_snapshot else None
+    context.writes = []
+
+def end():
+    context.t_id = None
+    context.snapshot = None
+    context.writes = []
+
+def in_transaction():
+    return getattr(context, 't_id', None) is not None
+
+def snapshot():
+    return getattr(context, 'snapshot', None)
+
+"""
+# Returns the timestamp to store in a record that is being written
+# queries run outside of a transaction commit immediately
+"""
+def write_timestamp():
+    if in_transaction():
+        return uncommitted_timestamp(context.t_id)
+    return clock.tick()
+
+def record_write(table, rid, is_base):
+    if in_transaction():
+        context.writes.append((table, rid, is_base))
+
+def is_visible(timestamp):
+    snapshot_time = snapshot()
+    if snapshot_time is None: #no snapshot, read the latest version
+        return True
+    if timestamp < 0:
+        return timestamp == uncommitted_timestamp(context.t_id)
+    return timestamp <= snapshot_time
+
+def is_visible_as_of(timestamp, time): #committed at or before time (and visible to the current snapshot)
+    return 0 <= timestamp <= time and is_visible(timestamp)
+
+"""
+# Stamps every record written by the current transaction with a new commit timestamp
+# the timestamp pages are pinned before the clock lock is taken (pinning may read from disk or evict), so the other
+# commits, snapshots and writes only wait for the stamping itself
+# Returns the commit timestamp
+"""
+def commit():
+    writes = getattr(context, 'writes', [])
+    page_rids = {} # key: (table, page_key, is_base) of a timestamp page, value: rids the transaction wrote in it
+    for table, rid, is_base in writes:
+        page_rids.setdefault((table, table.timestamp_page_key(rid, is_base), is_base), []).append(rid)
+    pinned = []
+    try:
+        for (table, page_key, is_base), rids in page_rids.items():
+            pinned.append((table, page_key, is_base, table.bufferpool.pin_page(table.name, page_key, is_base), rids))
+        with clock.thread_lock:
+            clock.time += 1
+            commit_time = clock.time
+            for table, page_key, is_base, page, rids in pinned:
+                for rid in rids:
+                    page.overwrite(rid, commit_time)
+    finally:
+        for table, page_key, is_base, page, rids in pinned:
+            table.bufferpool.unpin_page(table.name, page_key, is_base)
+    end()
+    return commit_time
@@ -1,5 +1,6 @@
 import struct
 import datetime
+import threading
 
 class Page: #This class manages a physical page; the table class is in charge of differentiating base vs tail logic
 
@@ -11,6 +12,7 @@ class Page: #This class manages a physical page; the table class is in charge of
         self.pin = 0
         self.tps = 0
         self.timestamp = datetime.datetime.now()
+        self.thread_lock = threading.Lock() #threads writing different slots of this page must not lose each other's num_records update
     
     def has_capacity(self): #returns the amount of ints that can be added to the base page before the total capacity of 4096 bits is reached
         return (self.max_records-self.num_records)
@@ -19,16 +21,31 @@ class Page: #This class manages a physical page; the table class is in charge of
         self.timestamp = datetime.datetime.now()
 
         index_within_page = -1
-        if (self.has_capacity()>0):
+        if rid!=None: #the slot is given by the rid, num_records is the highest slot written so far (slots skipped by non-cumulative tail records stay 0)
+            self.is_dirty = 1
+            index_within_page = rid%self.max_records
+            struct.pack_into('i', self.data, index_within_page*64, value)
+            with self.thread_lock:
+                self.num_records = max(self.num_records, index_within_page+1)
+        elif (self.has_capacity()>0):
             self.is_dirty = 1
             index_within_page = self.num_records
-            if rid!=None:
-                index_within_page = rid%self.max_records
             packed_bytes = struct.pack('i', value)
             self.data[index_within_page*64:index_within_page*64+len(packed_bytes)] = packed_bytes
             self.num_records += 1
         return index_within_page
     
+    def write_many(self, values, rid): #writes values into consecutive slots starting at rid's slot, the caller makes sure they fit in the page
+        self.timestamp = datetime.datetime.now()
+        self.is_dirty = 1
+        index_within_page = rid % self.max_records
+        for value in values:
+            struct.pack_into('i', self.data, index_within_page*64, value)
+            index_within_page += 1
+        with self.thread_lock:
+            self.num_records = max(self.num_records, index_within_page)
+        return
+
     def overwrite(self, rid, value): #returns rid (the index in the bytearray) if the value was written
         self.timestamp = datetime.datetime.now()
         self.is_dirty = 1
@@ -43,10 +60,16 @@ class Page: #This class manages a physical page; the table class is in charge of
         value = struct.unpack('i', self.data[index_within_page*64:index_within_page*64+struct.calcsize('i')])[0]
         return value
     
+    def read_all(self, count=None): #returns the values of the first count slots (every written slot by default) straight from the page buffer
+        if count is None:
+            count = self.num_records
+        return memoryview(self.data).cast('i')[::16][:count].tolist() #each slot is 64 bytes = 16 ints, the value is the first one
+
     # creates a shallow copy of the instance
     def copy(self):
         new_instance = Page()
         new_instance.num_records = self.num_records
         new_instance.max_records = self.max_records
         new_instance.data = self.data[:]
+        new_instance.tps = self.tps
         return new_instance
\ No newline at end of file
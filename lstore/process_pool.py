@@ -0,0 +1,201 @@
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+from lstore.transaction_worker import TransactionWorker
+from lstore.transaction_pool import TransactionPool
+import multiprocessing
+import os
+import pickle
+import queue
+import time
+import traceback
+
+POINT_QUERIES = ('insert', 'select', 'select_version', 'update', 'delete', 'increment')
+
+"""
+# Main loop of a partition process
+# the process owns its own Database (and bufferpool) stored under path and only sees the records routed to it
+# every request gets one reply on results: ("ok", value) or ("error", exception) if handling it raised
+"""
+def serve_partition(path, requests, results, num_threads):
+    db = Database()
+    db.open(path)
+    pool = TransactionPool(num_threads) #threads of a pool created before the fork don't exist in this process
+    queries = {}
+    while True:
+        message = requests.get()
+        try:
+            if handle_request(db, pool, queries, message, results, num_threads):
+                return
+        except Exception as error:
+            results.put(("error", picklable(error)))
+
+def picklable(error): #exceptions holding unpicklable state are sent as a RuntimeError with the traceback
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return RuntimeError("".join(traceback.format_exception(type(error), error, error.__traceback__)))
+
+def handle_request(db, pool, queries, message, results, num_threads): #returns True once the process must stop
+    kind = message[0]
+    if kind == "create_table":
+        name, num_columns, key_index = message[1:]
+        queries[name] = Query(db.create_table(name, num_columns, key_index))
+        results.put(("ok", True))
+    elif kind == "get_table":
+        name = message[1]
+        queries[name] = Query(db.get_table(name))
+        results.put(("ok", True))
+    elif kind == "run": #message[1] is a list of transactions, each a list of (query name, table name, args)
+        workers = [TransactionWorker(pool=pool) for i in range(num_threads)]
+        for i in range(len(message[1])):
+            transaction = Transaction()
+            for query_name, table_name, args in message[1][i]:
+                query = queries[table_name]
+                transaction.add_query(getattr(query, query_name), query.table, *args)
+            workers[i % num_threads].add_transaction(transaction)
+        for worker in workers:
+            worker.run()
+        for worker in workers:
+            worker.join()
+        results.put(("ok", sum(worker.result for worker in workers)))
+    elif kind == "query":
+        query_name, table_name, args = message[1:]
+        results.put(("ok", getattr(queries[table_name], query_name)(*args)))
+    elif kind == "close":
+        db.close()
+        results.put(("ok", True))
+        return True
+    return False
+
+class ProcessPool:
+    """
+    # Runs transactions on worker processes, each process owns one partition of every table (records are routed by primary key)
+    # escapes the interpreter lock that all TransactionWorker threads of one process share
+    :param path: string            #directory holding one database per partition
+    :param num_processes: int      #number of partitions/processes
+    :param threads_per_process: int  #TransactionWorker threads used inside every process
+    :param timeout: float          #seconds to wait for the reply of a partition, None waits as long as its process is alive
+    # an exception raised in a partition process is raised again by the call that was waiting for it
+    """
+    def __init__(self, path, num_processes=4, threads_per_process=1, timeout=None):
+        self.path = path
+        self.timeout = timeout
+        self.num_processes = num_processes
+        self.table_keys = {} # key: table name, value: index of the primary key column
+        self.transactions = [[] for i in range(num_processes)]
+        self.result = 0
+        self.requests = []
+        self.results = []
+        self.processes = []
+        for i in range(num_processes):
+            requests = multiprocessing.Queue()
+            results = multiprocessing.Queue()
+            process = multiprocessing.Process(target=serve_partition, args=(os.path.join(path, "partition"+str(i)), requests, results, threads_per_process))
+            process.start()
+            self.requests.append(requests)
+            self.results.append(results)
+            self.processes.append(process)
+
+    def create_table(self, name, num_columns, key_index):
+        self.table_keys[name] = key_index
+        for requests in self.requests:
+            requests.put(("create_table", name, num_columns, key_index))
+        self.results_of_all()
+
+    def get_table(self, name, key_index=0): #table created before the pool was reopened
+        self.table_keys[name] = key_index
+        for requests in self.requests:
+            requests.put(("get_table", name))
+        self.results_of_all()
+
+    """
+    # Returns the reply of partition i
+    # raises the exception of the partition, or a RuntimeError if its process died or the timeout ran out
+    """
+    def reply(self, i):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            try:
+                status, value = self.results[i].get(timeout=0.1)
+                break
+            except queue.Empty:
+                if not self.processes[i].is_alive() and self.results[i].empty():
+                    raise RuntimeError(f"Partition process {i} exited with code {self.processes[i].exitcode}.")
+                if deadline is not None and time.monotonic() > deadline:
+                    raise RuntimeError(f"Partition process {i} did not reply within {self.timeout} seconds.")
+        if status == "error":
+            raise value
+        return value
+
+    def results_of_all(self): #waits for the reply of every partition before raising the first error
+        values = []
+        error = None
+        for i in range(self.num_processes):
+            try:
+                values.append(self.reply(i))
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return values
+
+    def partition(self, key):
+        return hash(key) % self.num_processes
+
+    """
+    # Returns the partition owning the records a query touches
+    # only point queries on the primary key can be routed
+    """
+    def route(self, query_name, table_name, args):
+        key_index = self.table_keys[table_name]
+        if query_name not in POINT_QUERIES:
+            raise ValueError(f"{query_name} spans every partition and cannot run in a process transaction.")
+        if query_name == 'insert':
+            return self.partition(args[key_index])
+        if query_name in ('select', 'select_version') and args[1] != key_index:
+            raise ValueError("Selects in a process transaction must search on the primary key.")
+        return self.partition(args[0])
+
+    """
+    # Adds a transaction given as a list of (query name, table name, *args), e.g. [("update", "Grades", key, None, 1, None, 2, None)]
+    # every query of the transaction must route to the same partition
+    """
+    def add_transaction(self, queries):
+        transaction = []
+        partitions = set()
+        for query_name, table_name, *args in queries:
+            partitions.add(self.route(query_name, table_name, args))
+            transaction.append((query_name, table_name, args))
+        if len(partitions) > 1:
+            raise ValueError("The queries of a transaction must all belong to one partition.")
+        self.transactions[partitions.pop()].append(transaction)
+
+    """
+    # Runs every added transaction and waits for all of them
+    # Returns the number of transactions that committed
+    """
+    def run(self):
+        for i in range(self.num_processes):
+            self.requests[i].put(("run", self.transactions[i]))
+        self.transactions = [[] for i in range(self.num_processes)]
+        self.result = sum(self.results_of_all())
+        return self.result
+
+    """
+    # Runs one point query outside of a transaction on the owning partition and returns its result
+    """
+    def query(self, query_name, table_name, *args):
+        i = self.route(query_name, table_name, args)
+        self.requests[i].put(("query", query_name, table_name, args))
+        return self.reply(i)
+
+    def close(self):
+        for requests in self.requests:
+            requests.put(("close",))
+        try:
+            self.results_of_all()
+        finally:
+            for process in self.processes:
+                process.join(self.timeout)
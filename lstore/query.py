@@ -1,7 +1,19 @@
-from lstore.table import SCHEMA_ENCODING_COLUMN, Table, Record
+from lstore.table import INDIRECTION_COLUMN, RID_COLUMN, TIMESTAMP_COLUMN, SCHEMA_ENCODING_COLUMN, DELETED, Table, Record, schema_bits, column_updated
 from lstore.index import Index
+from lstore.page import Page
+from lstore.Bufferpool import RingBuffer
+from lstore import mvcc
 import struct
-RID_COLUMN = 1
+import csv
+import operator
+
+OPERATORS = {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+class RingPages(dict): #pages dictionary of a batch that reads the pages missing from the bufferpool through a ring buffer, its pages are not pinned
+    def __init__(self, ring):
+        super().__init__()
+        self.ring = ring
+
 class Query:
     """
     # Creates a Query object that can perform different queries on the specified table 
@@ -13,6 +25,13 @@ class Query:
     def __init__(self, table):
         self.table = table
 
+    """
+    # Delete the record with the specified primary key
+    # the delete is a tail record whose schema encoding is DELETED (it holds a copy of the deleted version), so reads of
+    # a snapshot or of a time before the delete still see the record
+    # Returns True upon succesful deletion
+    # Returns False if the primary key is not found
+    """
     def delete(self, primary_key):
         # Locate the RID for the primary key
         result = self.table.index.locate(self.table.key, primary_key)
@@ -20,25 +39,32 @@ class Query:
             return False  # if primary key is not found
         rid = result[0]
 
-        # Calculate the page and record number
         max_records = self.table.max_records
-        page_number = rid // max_records
-        record_number = rid % max_records
-
-        # Determine the base page index for the schema encoding column
-        schema_encoding_page_col = 2
-
-        # Retrieve the base page for the schema encoding column
-        base_page = self.table.bufferpool.get_page(self.table.name, page_number * (self.table.num_columns + 4) + schema_encoding_page_col, True)
+        num_columns = self.table.num_columns
+        base_page_index = (rid // max_records)*(num_columns+4)
+        prev_version_rid = self.table.bufferpool.get_page(self.table.name, base_page_index+INDIRECTION_COLUMN, True).read_val(rid)
+        if prev_version_rid == -1:
+            values = self.read_version((rid, True), [1]*num_columns)
+        else:
+            values = self.read_version((prev_version_rid, False), [1]*num_columns)
 
-        # Mark the record as deleted by setting its schema encoding to -1
-        base_page.overwrite(record_number, -1)
+        with self.table.update_thread_lock:
+            tail_rid = self.table.total_tail_records
+            self.table.total_tail_records += 1
+            if (tail_rid != 0 and tail_rid % max_records == 0): #if there's no capacity
+                self.table.init_tail_page_dir()
+        pages_start = (tail_rid // max_records)*(num_columns+5)
+        #indirection, rid, time_stamp and schema_encoding columns, the deleted version, then the base rid
+        for i, value in enumerate([prev_version_rid, tail_rid, mvcc.write_timestamp(), DELETED] + values + [rid]):
+            with self.table.bufferpool.pinned_page(self.table.name, pages_start+i, False) as page:
+                page.write(value, tail_rid)
+        mvcc.record_write(self.table, tail_rid, False)
+        with self.table.bufferpool.pinned_page(self.table.name, base_page_index+INDIRECTION_COLUMN, True) as page:
+            page.overwrite(rid, tail_rid)
+        self.table.add_version(rid, tail_rid)
 
-        key_col = self.table.key
-        rid = self.table.index.locate(key_col, primary_key)[0]
-        record = self.select_record(primary_key, key_col, [1]*self.table.num_columns)[0]
-        for i in range(len(record)):
-            self.table.index.delete_index(i, record[i], rid)
+        for i in range(len(values)): # the entries stay in the removed entries of the index for the older versions
+            self.table.index.delete_index(i, values[i], rid)
 
         return True
     
@@ -61,12 +87,12 @@ class Query:
                     self.table.init_page_dir() #add one base page (a set of physical pages, one for each column)
                 num_pages = self.table.num_pages
             pages_start = (num_pages+1) - (self.table.num_columns+4)
-            for i in range(self.table.num_columns):
-                self.table.bufferpool.get_page(self.table.name, i+4+pages_start, True).write(columns[i], rid)
-            self.table.bufferpool.get_page(self.table.name, pages_start, True).write(-1, rid) #indirection_column = -1 means no tail record exists
-            self.table.bufferpool.get_page(self.table.name, pages_start+1, True).write(rid, rid) #rid column
-            self.table.bufferpool.get_page(self.table.name, pages_start+2, True).write(0, rid) #time_stamp column
-            self.table.bufferpool.get_page(self.table.name, pages_start+3, True).write(0, rid) #schema_encoding column
+            #indirection_column = -1 means no tail record exists, then the rid, time_stamp and schema_encoding columns and the data columns
+            values = [-1, rid, mvcc.write_timestamp(), 0] + list(columns)
+            for i in range(self.table.num_columns+4):
+                with self.table.bufferpool.pinned_page(self.table.name, pages_start+i, True) as page:
+                    page.write(values[i], rid)
+            mvcc.record_write(self.table, rid, True)
             self.table.index.add_index(self.table.key, columns[self.table.key], rid) # add index
             for i in range(self.table.num_columns):
                 self.table.index.add_index(i, columns[i], rid)
@@ -74,6 +100,246 @@ class Query:
         else:
             return False
 
+    """
+    # Insert many records at once
+    # :param rows: iterable of records, each a sequence of num_columns ints
+    # reserves one block of rids, writes every page of the block once per column and updates each index once
+    # Returns True upon succesful insertion
+    # Returns False (and inserts nothing) if a row doesn't have num_columns values, or a primary key already exists or appears twice in rows
+    """
+    def insert_many(self, rows, t_id=None):
+        rows = [list(row) for row in rows]
+        if len(rows) == 0:
+            return True
+        if any(len(row) != self.table.num_columns for row in rows): #checked before any rid is reserved, a reserved rid that is never written would stay a zeroed slot
+            return False
+        key_col = self.table.key
+        keys = [row[key_col] for row in rows]
+        if len(set(keys)) != len(keys):
+            return False
+        for key in keys:
+            if self.table.index.locate(key_col, key) != []:
+                return False
+        max_records = self.table.max_records
+        timestamp = mvcc.write_timestamp() #outside of a transaction the whole block commits at once
+        with self.table.thread_lock:
+            first_rid = self.table.rid
+            self.table.rid += len(rows)
+            start = 0
+            while start < len(rows): #fill one page set at a time
+                rid = first_rid + start
+                count = min(len(rows) - start, max_records - rid % max_records)
+                block = rows[start:start+count]
+                page_values = [[-1]*count, range(rid, rid+count), [timestamp]*count, [0]*count] #indirection (-1 means no tail record exists), rid, time_stamp and schema_encoding columns
+                for i in range(self.table.num_columns):
+                    page_values.append([row[i] for row in block])
+                for j in range(count):
+                    self.table.lock_manager.acquire_exclusive_lock(rid+j, t_id)
+                if (rid != 0 and rid % max_records == 0): #if there's no capacity, the new base page is filled before it enters the bufferpool
+                    pages = []
+                    for values in page_values:
+                        page = Page()
+                        page.write_many(values, rid)
+                        pages.append(page)
+                    self.table.init_page_dir(pages)
+                else:
+                    pages_start = (rid // max_records)*(self.table.num_columns+4)
+                    for i in range(len(page_values)):
+                        with self.table.bufferpool.pinned_page(self.table.name, pages_start+i, True) as page:
+                            page.write_many(page_values[i], rid)
+                start += count
+        rids = range(first_rid, first_rid+len(rows))
+        for rid in rids:
+            mvcc.record_write(self.table, rid, True)
+        for i in range(self.table.num_columns):
+            self.table.index.add_many(i, [row[i] for row in rows], rids)
+        return True
+
+    """
+    # Insert the records of a csv file, one record per line
+    # :param path: string             #path of the csv file
+    # :param skip_header: bool        #the first line holds column names
+    # :param batch_size: int          #records passed to insert_many at a time
+    # Returns False if a batch could not be inserted (the batches before it stay inserted)
+    """
+    def insert_csv(self, path, skip_header=False, batch_size=4096):
+        with open(path, newline='') as f:
+            reader = csv.reader(f)
+            if skip_header:
+                next(reader, None)
+            batch = []
+            for line in reader:
+                batch.append([int(value) for value in line])
+                if len(batch) == batch_size:
+                    if not self.insert_many(batch):
+                        return False
+                    batch = []
+            return self.insert_many(batch)
+
+    """
+    # Returns a page from the bufferpool
+    # :param pages: dictionary of pages already fetched by the running batch, the page is looked up once per batch
+    # pages of a batch stay pinned until the batch calls release_pages
+    """
+    def read_page(self, page_index, is_base, pages=None):
+        if pages is None:
+            return self.table.bufferpool.get_page(self.table.name, page_index, is_base)
+        if (page_index, is_base) not in pages:
+            if isinstance(pages, RingPages):
+                pages[(page_index, is_base)] = self.table.bufferpool.get_page(self.table.name, page_index, is_base, pages.ring)
+            else:
+                pages[(page_index, is_base)] = self.table.bufferpool.pin_page(self.table.name, page_index, is_base)
+        return pages[(page_index, is_base)]
+
+    """
+    # Returns the pages dictionary for one page set of a scan over num_page_sets page sets reading pages_per_set pages of each
+    # scans larger than a quarter of the bufferpool get a ring buffer so they don't evict the pages other queries use
+    """
+    def scan_pages(self, num_page_sets, pages_per_set, ring=None):
+        if ring is not None:
+            return RingPages(ring)
+        if num_page_sets*pages_per_set > self.table.bufferpool.capacity // 4:
+            return RingPages(RingBuffer(max(32, (self.table.bufferpool.prefetch_depth+2)*pages_per_set)))
+        return {}
+
+    def prefetch_page_sets(self, page_sets, physical_columns, pages=None): #hints the bufferpool that these physical columns of these base page sets are read next
+        page_set_size = self.table.num_columns+4
+        self.table.bufferpool.prefetch(self.table.name, [page_set*page_set_size+column for page_set in page_sets for column in physical_columns], True, getattr(pages, 'ring', None))
+
+    def read_base_column(self, base_columns, base_page_index, column, count, pages): #values of a data column in the base page set, read once per page set
+        if column not in base_columns:
+            base_columns[column] = self.read_page(base_page_index+column+4, True, pages).read_all(count)
+        return base_columns[column]
+
+    def release_pages(self, pages): #unpins the pages fetched by a batch
+        if not isinstance(pages, RingPages):
+            for page_index, is_base in pages.keys():
+                self.table.bufferpool.unpin_page(self.table.name, page_index, is_base)
+        pages.clear()
+
+    """
+    # Finds the version of the base record rid seen by the running transaction (the latest version outside of transactions)
+    # :param relative_version: how many versions to go back from the visible one (0 or negative)
+    # Returns (rid, True) for the base record, (tail_rid, False) for a tail record, or None if the record is not visible
+    # or its visible version is a delete
+    # Going back further than the first tail record returns the base record
+    """
+    def locate_version(self, rid, relative_version=0, pages=None):
+        max_records = self.table.max_records #64 records
+        base_page_index = (rid // max_records)*(self.table.num_columns+4)
+        indirection = self.read_page(base_page_index+INDIRECTION_COLUMN, True, pages).read_val(rid)
+        counter = -relative_version # how many times we have to go back
+        versions = self.table.version_directory.get(rid)
+        if indirection != -1 and indirection >= self.table.tps and versions and versions[-1] == indirection: # the version directory is up to date, index it instead of walking the chain
+            i = len(versions) - 1
+            while i >= 0 and versions[i] >= self.table.tps and not mvcc.is_visible(self.read_page((versions[i] // max_records)*(self.table.num_columns+5)+TIMESTAMP_COLUMN, False, pages).read_val(versions[i])):
+                i -= 1 # only the newest versions can be uncommitted or newer than the snapshot
+            if i >= 0 and versions[i] >= self.table.tps:
+                if self.is_deleted((versions[i], False), pages):
+                    return None
+                i -= counter
+                if i < 0 or versions[i] < self.table.tps: # older than every tail record still in the chain
+                    return (rid, True)
+                return (versions[i], False)
+            indirection = -1
+        while indirection != -1 and indirection >= self.table.tps: # walk the tail records from newest to oldest
+            tail_page_index = (indirection // max_records)*(self.table.num_columns+5)
+            if mvcc.is_visible(self.read_page(tail_page_index+TIMESTAMP_COLUMN, False, pages).read_val(indirection)):
+                if counter == -relative_version and self.is_deleted((indirection, False), pages): # the visible version is a delete
+                    return None
+                if counter <= 0:
+                    return (indirection, False)
+                counter -= 1
+            indirection = self.read_page(tail_page_index+INDIRECTION_COLUMN, False, pages).read_val(indirection)
+        if not mvcc.is_visible(self.read_page(base_page_index+TIMESTAMP_COLUMN, True, pages).read_val(rid)):
+            return None # inserted after the snapshot was taken
+        if counter == -relative_version and self.is_deleted((rid, True), pages): # aborted insert, or a delete that was merged
+            return None
+        return (rid, True)
+
+    """
+    # Finds the newest version of base record rid committed at or before the commit timestamp time
+    # binary-searches the version directory by timestamp (commit timestamps grow along a chain, uncommitted versions are only at its head)
+    # Returns (rid, is_base) like locate_version, or None if the record was inserted after time or deleted at or before time
+    """
+    def locate_as_of(self, rid, time, pages=None):
+        max_records = self.table.max_records
+        base_page_index = (rid // max_records)*(self.table.num_columns+4)
+        indirection = self.read_page(base_page_index+INDIRECTION_COLUMN, True, pages).read_val(rid)
+        versions = self.table.version_directory.get(rid)
+        if indirection != -1 and indirection >= self.table.tps and versions and versions[-1] == indirection:
+            low = 0 #the version directory is up to date: versions[low:high] is still searched
+            high = len(versions)
+            while low < high:
+                middle = (low + high) // 2
+                timestamp = self.read_page((versions[middle] // max_records)*(self.table.num_columns+5)+TIMESTAMP_COLUMN, False, pages).read_val(versions[middle])
+                if timestamp >= 0 and timestamp <= time:
+                    low = middle + 1
+                else:
+                    high = middle
+            i = low - 1 # newest version committed at or before time
+            while i >= 0 and versions[i] >= self.table.tps:
+                if mvcc.is_visible_as_of(self.read_page((versions[i] // max_records)*(self.table.num_columns+5)+TIMESTAMP_COLUMN, False, pages).read_val(versions[i]), time):
+                    return None if self.is_deleted((versions[i], False), pages) else (versions[i], False)
+                i -= 1 # only hit when the transaction's snapshot is older than time
+            indirection = -1
+        while indirection != -1 and indirection >= self.table.tps: # walk the tail records from newest to oldest
+            tail_page_index = (indirection // max_records)*(self.table.num_columns+5)
+            if mvcc.is_visible_as_of(self.read_page(tail_page_index+TIMESTAMP_COLUMN, False, pages).read_val(indirection), time):
+                return None if self.is_deleted((indirection, False), pages) else (indirection, False)
+            indirection = self.read_page(tail_page_index+INDIRECTION_COLUMN, False, pages).read_val(indirection)
+        if not mvcc.is_visible_as_of(self.read_page(base_page_index+TIMESTAMP_COLUMN, True, pages).read_val(rid), time) or self.is_deleted((rid, True), pages):
+            return None # inserted after time, aborted insert or merged delete
+        return (rid, True)
+
+    def is_written(self, rid, pages=None): #False for a rid that was reserved by an insert that hasn't written the record (its slots are still zero)
+        return self.read_page((rid // self.table.max_records)*(self.table.num_columns+4)+RID_COLUMN, True, pages).read_val(rid) == rid
+
+    def is_deleted(self, version, pages=None): #True for the tail record of a delete, or a base record whose schema encoding is DELETED
+        rid, is_base = version
+        if is_base:
+            page_index = (rid // self.table.max_records)*(self.table.num_columns+4)
+        else:
+            page_index = (rid // self.table.max_records)*(self.table.num_columns+5)
+        return self.read_page(page_index+SCHEMA_ENCODING_COLUMN, is_base, pages).read_val(rid) == DELETED
+
+    def reads_history(self, relative_version=0, as_of=None): #reads that may return a version older than the latest one also look at the removed index entries
+        return relative_version != 0 or as_of is not None or mvcc.snapshot() is not None
+
+    """
+    # Reads the projected columns of a version returned by locate_version
+    # columns a non-cumulative tail record doesn't hold are read from the older versions it points to
+    # :param full_columns: return num_columns values with None for the columns that are not projected
+    """
+    def read_version(self, version, projected_columns_index, pages=None, full_columns=False):
+        rid, is_base = version
+        max_records = self.table.max_records
+        columns = [None]*len(projected_columns_index)
+        missing = list(projected_columns_index)
+        while 1 in missing:
+            if is_base:
+                page_index = (rid // max_records)*(self.table.num_columns+4)
+                schema_encoding = -1 #the base record holds every column
+            else:
+                page_index = (rid // max_records)*(self.table.num_columns+5)
+                schema_encoding = -1 #a cumulative tail record holds every column
+                if not self.table.cumulative:
+                    schema_encoding = self.read_page(page_index+SCHEMA_ENCODING_COLUMN, False, pages).read_val(rid)
+            for i in range(len(missing)):
+                if missing[i] == 1 and column_updated(schema_encoding, i):
+                    columns[i] = self.read_page(page_index+i+4, is_base, pages).read_val(rid)
+                    missing[i] = 0
+            if 1 in missing: # continue with the previous version
+                prev_version_rid = self.read_page(page_index+INDIRECTION_COLUMN, False, pages).read_val(rid)
+                if prev_version_rid == -1 or prev_version_rid < self.table.tps:
+                    rid = self.read_page(page_index+self.table.num_columns+4, False, pages).read_val(rid) #base rid column of the tail record
+                    is_base = True
+                else:
+                    rid = prev_version_rid
+        if full_columns:
+            return columns
+        return [columns[i] for i in range(len(columns)) if projected_columns_index[i] == 1]
+
     """
     # Read matching record with specified search key
     # :param search_key: the value you want to search based on
@@ -84,33 +350,7 @@ class Query:
     # Assume that select will never be called on a key that doesn't exist
     """
     def select(self, search_key, search_key_index, projected_columns_index):
-        # get index with search_key
-        # go to base page of record
-        # check indirection column (whether it has been updated or not)
-        # if it has been updated, go to tail page and find the record
-        # if it has not been updated, retrieve the projected_columns 
-        # create a record with the info and return it
-        record_list = []
-        key_rid = self.table.index.locate(search_key_index, search_key)
-        for key in key_rid:
-            max_records = self.table.max_records #64 records
-            base_page_index = (key // max_records)*(self.table.num_columns+4)
-            indirection = self.table.bufferpool.get_page(self.table.name, base_page_index, True).read_val(key) # other version: change to only base_page_index
-            columns = []
-            if indirection == -1 or indirection < self.table.tps: # has not been updated (return record in base page)
-                for i in range(len(projected_columns_index)):
-                    if projected_columns_index[i] == 1:
-                        data = self.table.bufferpool.get_page(self.table.name, base_page_index+i+4, True).read_val(key)
-                        columns.append(data)
-            else: # has been updated, get tail page (return record in tail page)
-                tail_page_index = (indirection // max_records)*(self.table.num_columns+5)
-                for i in range(len(projected_columns_index)):
-                    if projected_columns_index[i] == 1:
-                        data = self.table.bufferpool.get_page(self.table.name, tail_page_index+i+4, False).read_val(indirection)
-                        columns.append(data)
-            new_record = Record(key, search_key, columns)
-            record_list.append(new_record)
-        return record_list
+        return self.select_version(search_key, search_key_index, projected_columns_index, 0)
     
     """
     # Read matching record with specified search key
@@ -123,44 +363,185 @@ class Query:
     # Assume that select will never be called on a key that doesn't exist
     """
     def select_version(self, search_key, search_key_index, projected_columns_index, relative_version):
-        record_list = []
-        key_rid = self.table.index.locate(search_key_index, search_key)
-        for key in key_rid:
-            max_records = self.table.max_records #64 records
-            base_page_index = (key // max_records)*(self.table.num_columns+4)
-            indirection = self.table.bufferpool.get_page(self.table.name, base_page_index, True).read_val(key) # other version: change to only base_page_index
-            columns = []
-            if indirection == -1 or indirection < self.table.tps: # has not been updated (return record in base page)
-                for i in range(len(projected_columns_index)):
-                    if projected_columns_index[i] == 1:
-                        data = self.table.bufferpool.get_page(self.table.name, base_page_index+i+4, True).read_val(key)
-                        columns.append(data)
-            else: # has been updated, get tail page (return record in tail page with correct version)
-                tail_page_index = (indirection // max_records)*(self.table.num_columns+5)
-                counter = -relative_version # how many times we have to go back
-                has_past = True # if there is more versions before the current tail record
-                while(counter > 0 and has_past): # keep going back until it reaches the desired version
-                    tail_page_index = (indirection // max_records)*(self.table.num_columns+5)
-                    indirection = self.table.bufferpool.get_page(self.table.name, tail_page_index, False).read_val(indirection)
-                    counter -= 1
-                    if indirection == -1 or indirection < self.table.tps:
-                        has_past = False
-                if has_past:
-                    tpage_set = indirection // max_records
-                    for i in range(len(projected_columns_index)):
-                        if projected_columns_index[i] == 1:
-                            data = self.table.bufferpool.get_page(self.table.name, i+4+tpage_set*(self.table.num_columns+5), False).read_val(indirection)
-                            columns.append(data)
-                else: # if it's asking for versions that doesn't exist, return base page
-                    for i in range(len(projected_columns_index)):
-                        if projected_columns_index[i] == 1:
-                            data = self.table.bufferpool.get_page(self.table.name, base_page_index+i+4, True).read_val(key)
-                            columns.append(data)
-            new_record = Record(key, search_key, columns)
-            record_list.append(new_record)
-            base_page_index = (key // max_records)*(self.table.num_columns+4)     
-        return record_list
+        return list(self.select_iter(search_key, search_key_index, projected_columns_index, relative_version))
+
+    """
+    # Read matching record as it was at a point in time
+    # :param search_key: the value you want to search based on
+    # :param search_key_index: the column index you want to search based on
+    # :param projected_columns_index: what columns to return. array of 1 or 0 values.
+    # :param timestamp: commit timestamp (see mvcc.clock.now()), the versions committed at or before it are read
+    # Returns a list of Record objects upon success, records inserted after timestamp are left out
+    """
+    def select_as_of(self, search_key, search_key_index, projected_columns_index, timestamp):
+        return list(self.select_iter(search_key, search_key_index, projected_columns_index, as_of=timestamp))
+
+    """
+    # Same as select_version but yields the Record objects one at a time instead of returning a list
+    # as_of, if given, is a commit timestamp to read the records at instead of relative_version (see select_as_of)
+    # only the records whose version read holds search_key are returned, the index may point to other versions of a record
+    # every record is checked when the column has no index (the base pages a temporary index is built from miss the updates),
+    # and for as_of reads on a column other than the primary key (its index only holds the values written while it existed)
+    """
+    def select_iter(self, search_key, search_key_index, projected_columns_index, relative_version=0, as_of=None):
+        needed = list(projected_columns_index)
+        needed[search_key_index] = 1
+        if self.table.index.indices[search_key_index] is not None and (as_of is None or search_key_index == self.table.key):
+            for rid in self.table.index.locate(search_key_index, search_key, self.reads_history(relative_version, as_of)):
+                values = self.read_matching(rid, search_key, search_key_index, needed, relative_version, as_of)
+                if values is not None:
+                    yield Record(rid, search_key, [values[i] for i in range(len(values)) if projected_columns_index[i] == 1])
+            return
+        max_records = self.table.max_records
+        num_records = self.table.rid
+        for page_set in range((num_records + max_records - 1) // max_records):
+            pages = {} #pages of the page set, pinned until the page set is resolved
+            records = []
+            try:
+                for rid in range(page_set*max_records, min((page_set+1)*max_records, num_records)):
+                    if not self.is_written(rid, pages):
+                        continue
+                    values = self.read_matching(rid, search_key, search_key_index, needed, relative_version, as_of, pages)
+                    if values is not None:
+                        records.append(Record(rid, search_key, [values[i] for i in range(len(values)) if projected_columns_index[i] == 1]))
+            finally:
+                self.release_pages(pages)
+            yield from records
+
+    def read_matching(self, rid, search_key, search_key_index, needed, relative_version=0, as_of=None, pages=None): #the needed columns of the version of rid the query reads, None if it is not visible or doesn't hold search_key
+        if as_of is None:
+            version = self.locate_version(rid, relative_version, pages)
+        else:
+            version = self.locate_as_of(rid, as_of, pages)
+        if version is None:
+            return None
+        values = self.read_version(version, needed, pages, True)
+        if values[search_key_index] != search_key:
+            return None
+        return values
+
+    """
+    # Yields the records whose value in an indexed column is within [begin, end], in order of that value
+    # :param begin: the smallest value to return (None for no lower bound)
+    # :param end: the largest value to return (None for no upper bound)
+    # :param search_key_index: the indexed column the range applies to
+    # :param projected_columns_index: what columns to return. array of 1 or 0 values.
+    # :param chunk_size: records resolved together, only one chunk of Record objects exists at a time
+    # Record.key holds the value of the search column
+    """
+    def select_range_iter(self, begin, end, search_key_index, projected_columns_index, relative_version=0, chunk_size=1024):
+        columns = [i for i in range(len(projected_columns_index)) if projected_columns_index[i] == 1]
+        chunk = []
+        for key, rid in self.table.index.iter_range(search_key_index, begin, end, self.reads_history(relative_version)):
+            chunk.append((key, rid))
+            if len(chunk) == chunk_size:
+                yield from self.__resolve_chunk(chunk, columns, search_key_index, relative_version)
+                chunk = []
+        yield from self.__resolve_chunk(chunk, columns, search_key_index, relative_version)
+
+    def __resolve_chunk(self, chunk, columns, search_key_index, relative_version):
+        values = self.resolve_columns([rid for key, rid in chunk], columns + [search_key_index], relative_version)
+        for i in range(len(chunk)):
+            if values[i] is not None and values[i][-1] == chunk[i][0]: #the version read still holds the key of the index entry
+                yield Record(chunk[i][1], chunk[i][0], values[i][:-1])
     
+    """
+    # Read the records matching each of many search keys
+    # :param search_keys: list of values you want to search based on
+    # :param search_key_index: the column index you want to search based on
+    # :param projected_columns_index: what columns to return. array of 1 or 0 values.
+    # looks every key up in one pass over the index and reads each page once for the whole batch
+    # Returns a list holding, for each search key in input order, the list of Record objects select would return
+    """
+    def select_many(self, search_keys, search_key_index, projected_columns_index):
+        key_rids = self.table.index.locate_many(search_key_index, search_keys, self.reads_history())
+        needed = list(projected_columns_index)
+        needed[search_key_index] = 1
+        max_records = self.table.max_records
+        pages = {} #pages of the page set being resolved, pinned until the next page set
+        values = {} # key: base rid, value: needed columns of the visible version (None if not visible)
+        page_set = None
+        try:
+            for rid in sorted(set(rid for rids in key_rids for rid in rids), key=lambda rid: rid // max_records): #resolve the records page set by page set
+                if rid // max_records != page_set:
+                    self.release_pages(pages)
+                    page_set = rid // max_records
+                version = self.locate_version(rid, 0, pages)
+                values[rid] = None if version is None else self.read_version(version, needed, pages, True)
+        finally:
+            self.release_pages(pages)
+        record_lists = []
+        for search_key, rids in zip(search_keys, key_rids):
+            record_lists.append([Record(rid, search_key, [values[rid][i] for i in range(len(needed)) if projected_columns_index[i] == 1]) for rid in rids if values[rid] is not None and values[rid][search_key_index] == search_key])
+        return record_lists
+
+    """
+    # Stream the records matching a predicate, reading the table one base page set at a time
+    # :param predicate: list of (column index, operator, value) conditions that must all hold, operator is one of == != < <= > >=
+    # :param projected_columns_index: what columns to return. array of 1 or 0 values.
+    # conditions are checked one column at a time over the base page buffers, tail versions are only resolved for updated
+    # records the base values can't rule out (a condition on a column the schema encoding shows no update of is decided by the base value)
+    # Yields Record objects (key holds the primary key), deleted records are skipped
+    """
+    def scan(self, predicate, projected_columns_index):
+        conditions = [(column, OPERATORS[op], value) for column, op, value in predicate]
+        num_columns = self.table.num_columns
+        max_records = self.table.max_records
+        key_col = self.table.key
+        needed = [1 if projected_columns_index[i] == 1 or i == key_col or any(column == i for column, op, value in conditions) else 0 for i in range(num_columns)]
+        output_columns = [i for i in range(num_columns) if projected_columns_index[i] == 1]
+        num_records = self.table.rid
+        num_page_sets = (num_records + max_records - 1) // max_records
+        prefetched_columns = [INDIRECTION_COLUMN, RID_COLUMN, SCHEMA_ENCODING_COLUMN, TIMESTAMP_COLUMN] + [i+4 for i in range(num_columns) if needed[i] == 1]
+        ring = None
+        for page_set in range(num_page_sets):
+            pages = self.scan_pages(num_page_sets, len(prefetched_columns), ring) #pages of this page set and of the tail records it points to, pinned until the page set is resolved unless read through a ring
+            ring = getattr(pages, 'ring', None)
+            self.prefetch_page_sets(range(page_set+1, min(page_set+1+self.table.bufferpool.prefetch_depth, num_page_sets)), prefetched_columns, pages)
+            first_rid = page_set*max_records
+            count = min(max_records, num_records - first_rid)
+            base_page_index = page_set*(num_columns+4)
+            records = []
+            try:
+                indirections = self.read_page(base_page_index+INDIRECTION_COLUMN, True, pages).read_all(count)
+                rids = self.read_page(base_page_index+RID_COLUMN, True, pages).read_all(count)
+                schema_encodings = self.read_page(base_page_index+SCHEMA_ENCODING_COLUMN, True, pages).read_all(count)
+                timestamps = self.read_page(base_page_index+TIMESTAMP_COLUMN, True, pages).read_all(count)
+                base_columns = {} # key: column, value: base values of the page set, read when first needed
+                base_slots = [] # slots of the records whose base record is the only version
+                updated_slots = [] # slots of the records with tail records
+                for j in range(count):
+                    if schema_encodings[j] == DELETED or rids[j] != first_rid + j: #deleted, or reserved by an insert that hasn't written it
+                        continue
+                    if indirections[j] == -1 or indirections[j] < self.table.tps:
+                        if mvcc.is_visible(timestamps[j]):
+                            base_slots.append(j)
+                    else:
+                        updated_slots.append(j)
+                for column, op, value in conditions: #one condition at a time over the whole base column
+                    values = self.read_base_column(base_columns, base_page_index, column, count, pages)
+                    base_slots = [j for j in base_slots if op(values[j], value)]
+                    updated_slots = [j for j in updated_slots if column_updated(schema_encodings[j], column) or op(values[j], value)] #no version changed the column, its base value decides
+                rows = {} # key: slot of an updated record that matches, value: the needed columns of its visible version
+                for j in updated_slots: #tail versions are only resolved for the candidates left
+                    version = self.locate_version(first_rid + j, 0, pages)
+                    if version is None:
+                        continue
+                    values = self.read_version(version, needed, pages, True)
+                    if all(op(values[column], value) for column, op, value in conditions):
+                        rows[j] = values
+                if base_slots:
+                    for i in output_columns + [key_col]:
+                        self.read_base_column(base_columns, base_page_index, i, count, pages)
+                for j in sorted(base_slots + list(rows)):
+                    if j in rows:
+                        records.append(Record(first_rid + j, rows[j][key_col], [rows[j][i] for i in output_columns]))
+                    else:
+                        records.append(Record(first_rid + j, base_columns[key_col][j], [base_columns[i][j] for i in output_columns]))
+            finally:
+                self.release_pages(pages)
+            yield from records
+
     """
     # Update a record with specified key and columns
     # Returns True if update is succesful
@@ -188,44 +569,149 @@ class Query:
             # write the first 4 columns of the tail record: indirection column, rid, schema_encoding, and time_stamp
             # make the indirection column of the tail record hold the rid currently held in the base record's indirection column
                 # tail record of indirection column will then point to the prev version of data -> will be -1 if the prev version is the base record, based on our implementation of insert_record
+            schema_encoding = schema_bits(columns)
             prev_version_rid = self.table.bufferpool.get_page(self.table.name, page_set*(self.table.num_columns+4), True).read_val(key_rid)
-            self.table.bufferpool.get_page(self.table.name, pages_start, False).write(prev_version_rid, tail_rid)
             #print("indirection column should be ",)
-            self.table.bufferpool.get_page(self.table.name, 1+pages_start, False).write(tail_rid, tail_rid) #Writing to the tail's rid column
-            self.table.bufferpool.get_page(self.table.name, 2+pages_start, False).write(0, tail_rid)
-            self.table.bufferpool.get_page(self.table.name, 3+pages_start, False).write(0, tail_rid)
+            for i, value in enumerate([prev_version_rid, tail_rid, mvcc.write_timestamp(), schema_encoding]): #indirection, rid, time_stamp and schema_encoding columns
+                with self.table.bufferpool.pinned_page(self.table.name, i+pages_start, False) as page:
+                    page.write(value, tail_rid)
+            mvcc.record_write(self.table, tail_rid, False)
             
             # write the actual data columns of the tail record
-            data = []
+            # cumulative tail records copy the previous version of every column, non-cumulative ones only hold the updated columns
             if (prev_version_rid == -1): # reference the base record during the update
-                for i in range(self.table.num_columns):
-                    value = self.table.bufferpool.get_page(self.table.name, i+4+page_set*(self.table.num_columns+4), True).read_val(key_rid)
-                    if (columns[i] != None):
-                        self.table.index.delete_index(i, value, key_rid)
-                        self.table.index.add_index(i, columns[i], key_rid)
-                        value = columns[i]
-                    self.table.bufferpool.get_page(self.table.name, i+4+pages_start, False).write(value, tail_rid)
-                    data.append(self.table.bufferpool.get_page(self.table.name, i+4+pages_start, False).read_val(tail_rid))
+                prev_version = (key_rid, True)
             else: # reference the prev_tail_record during the update
-                prev_tpage_set = prev_version_rid // max_records
-                for i in range(self.table.num_columns):
-                    value = self.table.bufferpool.get_page(self.table.name, i+4+prev_tpage_set*(self.table.num_columns+5), False).read_val(prev_version_rid)
-                    if (columns[i] != None):
-                        self.table.index.delete_index(i, value, key_rid)
-                        self.table.index.add_index(i, columns[i], key_rid)
-                        value = columns[i]
-                    self.table.bufferpool.get_page(self.table.name, i+4+pages_start, False).write(value, tail_rid)
-                    data.append(self.table.bufferpool.get_page(self.table.name, i+4+pages_start, False).read_val(tail_rid))
-            self.table.bufferpool.get_page(self.table.name, self.table.num_columns+4+pages_start, False).write(key_rid, tail_rid)
+                prev_version = (prev_version_rid, False)
+            if self.table.cumulative:
+                written_columns = [1]*self.table.num_columns
+            else:
+                written_columns = [1 if column_updated(schema_encoding, i) else 0 for i in range(self.table.num_columns)] #columns sharing the last schema bit are written together
+            values = self.read_version(prev_version, written_columns, full_columns=True)
+            for i in range(self.table.num_columns):
+                if written_columns[i] == 0:
+                    continue
+                value = values[i]
+                if (columns[i] != None):
+                    self.table.index.delete_index(i, value, key_rid)
+                    self.table.index.add_index(i, columns[i], key_rid)
+                    value = columns[i]
+                with self.table.bufferpool.pinned_page(self.table.name, i+4+pages_start, False) as page:
+                    page.write(value, tail_rid)
+            with self.table.bufferpool.pinned_page(self.table.name, self.table.num_columns+4+pages_start, False) as page:
+                page.write(key_rid, tail_rid)
             #update indirection column of base record
-            self.table.bufferpool.get_page(self.table.name, page_set*(self.table.num_columns+4), True).overwrite(key_rid, tail_rid)
+            with self.table.bufferpool.pinned_page(self.table.name, page_set*(self.table.num_columns+4), True) as page:
+                page.overwrite(key_rid, tail_rid)
+            self.table.add_version(key_rid, tail_rid)
             columns = []
             #update schema encoding column of base record
-            self.table.bufferpool.get_page(self.table.name, 3+page_set*(self.table.num_columns+4), True).overwrite(key_rid, 1)
+            with self.table.bufferpool.pinned_page(self.table.name, 3+page_set*(self.table.num_columns+4), True) as base_schema_page:
+                base_schema_page.overwrite(key_rid, base_schema_page.read_val(key_rid) | schema_encoding)
             return True
         else:
             return False  # if primary key not found
 
+    """
+    # Update many records at once
+    # :param updates: iterable of (key, columns) pairs, columns being the *columns argument of update
+    # reserves one block of tail rids, writes every tail page of the block once per column and every base page once
+    # a key given several times gets one tail record per update, in order
+    # Returns True if all updates were made
+    # Returns False (and updates nothing) if one of the keys does not exist
+    """
+    def update_many(self, updates):
+        updates = [(key, list(columns)) for key, columns in updates]
+        if len(updates) == 0:
+            return True
+        num_columns = self.table.num_columns
+        max_records = self.table.max_records
+        key_rids = self.table.index.locate_many(self.table.key, [key for key, columns in updates])
+        if [] in key_rids:
+            return False  # if primary key not found
+        pages = {}
+        latest = {} # key: base rid, value: position in the batch of its newest tail record
+        tail_values = [] # data columns of each new tail record
+        prev_versions = [] # indirection of each new tail record, ('batch', j) when it points to the j-th new tail record
+        base_rids = []
+        updated_bits = {} # key: base rid, value: schema encoding bits of its updates in this batch
+        try:
+            for j in range(len(updates)):
+                columns = updates[j][1]
+                rid = key_rids[j][0]
+                if rid in latest: # reference the tail record written earlier in this batch
+                    prev_version = ('batch', latest[rid])
+                    values = list(tail_values[latest[rid]])
+                else:
+                    prev_version_rid = self.read_page((rid // max_records)*(num_columns+4)+INDIRECTION_COLUMN, True, pages).read_val(rid)
+                    prev_version = prev_version_rid
+                    if prev_version_rid == -1: # reference the base record
+                        values = self.read_version((rid, True), [1]*num_columns, pages)
+                    else: # reference the prev_tail_record
+                        values = self.read_version((prev_version_rid, False), [1]*num_columns, pages)
+                for i in range(num_columns):
+                    if (columns[i] != None):
+                        self.table.index.delete_index(i, values[i], rid)
+                        self.table.index.add_index(i, columns[i], rid)
+                        values[i] = columns[i]
+                tail_values.append(values)
+                prev_versions.append(prev_version)
+                base_rids.append(rid)
+                latest[rid] = j
+                updated_bits[rid] = updated_bits.get(rid, 0) | schema_bits(columns)
+        finally:
+            self.release_pages(pages)
+
+        timestamp = mvcc.write_timestamp()
+        with self.table.update_thread_lock:
+            first_tail_rid = self.table.total_tail_records
+            self.table.total_tail_records += len(updates)
+            start = 0
+            while start < len(updates): #fill one tail page set at a time
+                tail_rid = first_tail_rid + start
+                count = min(len(updates) - start, max_records - tail_rid % max_records)
+                block = range(start, start+count)
+                page_values = [ #indirection, rid, time_stamp and schema_encoding columns, the data columns, then the base rid
+                    [first_tail_rid + prev_versions[j][1] if type(prev_versions[j]) == tuple else prev_versions[j] for j in block],
+                    range(tail_rid, tail_rid+count),
+                    [timestamp]*count,
+                    [schema_bits(updates[j][1]) for j in block],
+                ]
+                for i in range(num_columns): #every column is written since the whole page is written anyway, non-cumulative readers only use the updated ones
+                    page_values.append([tail_values[j][i] for j in block])
+                page_values.append([base_rids[j] for j in block])
+                if (tail_rid != 0 and tail_rid % max_records == 0): #if there's no capacity, the new tail page is filled before it enters the bufferpool
+                    new_pages = []
+                    for values in page_values:
+                        page = Page()
+                        page.write_many(values, tail_rid)
+                        new_pages.append(page)
+                    self.table.init_tail_page_dir(new_pages)
+                else:
+                    pages_start = (tail_rid // max_records)*(num_columns+5)
+                    for i in range(len(page_values)):
+                        with self.table.bufferpool.pinned_page(self.table.name, pages_start+i, False) as page:
+                            page.write_many(page_values[i], tail_rid)
+                start += count
+        for j in range(len(updates)):
+            mvcc.record_write(self.table, first_tail_rid + j, False)
+
+        #update indirection and schema encoding columns of the base records, one base page set at a time
+        page_sets = {}
+        for rid, j in latest.items():
+            if rid // max_records not in page_sets:
+                page_sets[rid // max_records] = []
+            page_sets[rid // max_records].append((rid, first_tail_rid + j))
+        for j in range(len(updates)):
+            self.table.add_version(base_rids[j], first_tail_rid + j)
+        for page_set, records in page_sets.items():
+            with self.table.bufferpool.pinned_page(self.table.name, page_set*(num_columns+4)+INDIRECTION_COLUMN, True) as indirection_page:
+                with self.table.bufferpool.pinned_page(self.table.name, page_set*(num_columns+4)+SCHEMA_ENCODING_COLUMN, True) as schema_page:
+                    for rid, tail_rid in records:
+                        indirection_page.overwrite(rid, tail_rid)
+                        schema_page.overwrite(rid, schema_page.read_val(rid) | updated_bits[rid])
+        return True
+
     """
     :param start_range: int         # Start of the key range to aggregate 
     :param end_range: int           # End of the key range to aggregate 
@@ -235,28 +721,7 @@ class Query:
     # Returns False if no record exists in the given range
     """
     def sum(self, start, end, column_index):
-        total_sum = 0
-        max_records = self.table.max_records #64 records
-        # get all rid's within list
-        rid_list = self.table.index.locate_range(column_index, start, end)
-        if len(rid_list) == 0:
-            return None
-
-        for rid in rid_list:
-            base_page_index = (rid // max_records)*(self.table.num_columns+4)
-            indirection = self.table.bufferpool.get_page(self.table.name, base_page_index, True).read_val(rid) # other version: change to only base_page_index
-            if indirection == -1 or indirection < self.table.tps: # has not been updated (return record in base page)
-                data = self.table.bufferpool.get_page(self.table.name, base_page_index+column_index+4, True).read_val(rid)
-                total_sum += data
-            else: # has been updated, get tail page (return record in tail page)
-                tail_page_index = (indirection // max_records)*(self.table.num_columns+5)
-                data = self.table.bufferpool.get_page(self.table.name, tail_page_index+column_index+4, False).read_val(indirection)
-                total_sum += data
-
-        if total_sum:
-            return total_sum
-        else:
-            return False
+        return self.sum_version(start, end, column_index, 0)
     
     """
     :param start_range: int         # Start of the key range to aggregate 
@@ -268,39 +733,142 @@ class Query:
     # Returns False if no record exists in the given range
     """
     def sum_version(self, start, end, column_index, version_num):
+        return self.__sum(start, end, column_index, version_num, None)
+
+    """
+    :param start_range: int         # Start of the key range to aggregate 
+    :param end_range: int           # End of the key range to aggregate 
+    :param aggregate_columns: int  # Index of desired column to aggregate
+    :param timestamp: int           # commit timestamp (see mvcc.clock.now()), the versions committed at or before it are summed
+    # this function is only called on the primary key.
+    # Returns the summation of the given range upon success
+    # Returns False if no record exists in the given range
+    """
+    def sum_as_of(self, start, end, column_index, timestamp):
+        return self.__sum(start, end, column_index, 0, timestamp)
+
+    def __sum(self, start, end, column_index, relative_version, as_of):
         total_sum = 0
-        max_records = self.table.max_records #64 records
         # get all rid's within list
-        rid_list = self.table.index.locate_range(column_index, start, end)
+        rid_list = self.table.index.locate_range(self.table.key, start, end, self.reads_history(relative_version, as_of))
         if len(rid_list) == 0:
             return None
-        for rid in rid_list:
-            base_page_index = (rid // max_records)*(self.table.num_columns+4)
-            indirection = self.table.bufferpool.get_page(self.table.name, base_page_index, True).read_val(rid)
-            if indirection == -1 or indirection < self.table.tps: # has not been updated (return record in base page)
-                data = self.table.bufferpool.get_page(self.table.name, base_page_index+column_index+4, True).read_val(rid)
-                total_sum += data
-            else: # has been updated, get tail page (return record in tail page)
-                counter = -version_num # how many times we have to go back
-                has_past = True # if there is more versions before the current tail record
-                while(counter > 0 and has_past): # keep going back until it reaches the desired version
-                    tail_page_index = (indirection // max_records)*(self.table.num_columns+5)
-                    indirection = self.table.bufferpool.get_page(self.table.name, tail_page_index, False).read_val(indirection)
-                    counter -= 1
-                    if indirection == -1 or indirection < self.table.tps:
-                        has_past = False
-                if has_past:
-                    tail_page_index = (indirection // max_records)*(self.table.num_columns+5)
-                    data = self.table.bufferpool.get_page(self.table.name, tail_page_index+column_index+4, False).read_val(indirection)
-                    total_sum += data
-                else: # if it's asking for versions that doesn't exist
-                    data = self.table.bufferpool.get_page(self.table.name, base_page_index+column_index+4, True).read_val(rid)
-                    total_sum += data
+        for values in self.resolve_columns(rid_list, [column_index, self.table.key], relative_version, as_of):
+            if values is not None and start <= values[1] <= end: #the version read still holds a key of the range
+                total_sum += values[0]
         if total_sum:
             return total_sum
         else:
             return False
     
+    """
+    # Reads some columns of many records, resolving the version of each record once
+    # :param rids: list of base rids
+    # :param columns: list of column indexes to read
+    # :param relative_version: the relative version of the records you need to retreive.
+    # :param as_of: commit timestamp to read the records at instead of relative_version (None for relative_version)
+    # works one base page set at a time: records without tail records are read from whole base page buffers
+    # Returns, for each rid in input order, the list of values of columns (None if the record is not visible or deleted)
+    """
+    def resolve_columns(self, rids, columns, relative_version=0, as_of=None):
+        num_columns = self.table.num_columns
+        max_records = self.table.max_records
+        projection = [1 if i in columns else 0 for i in range(num_columns)]
+        page_sets = {}
+        for rid in rids:
+            if rid // max_records not in page_sets:
+                page_sets[rid // max_records] = []
+            page_sets[rid // max_records].append(rid)
+        resolved = {}
+        order = list(page_sets.keys())
+        prefetched_columns = [INDIRECTION_COLUMN, TIMESTAMP_COLUMN, SCHEMA_ENCODING_COLUMN] + [column+4 for column in columns]
+        ring = None
+        for i in range(len(order)):
+            page_set = order[i]
+            page_set_rids = page_sets[page_set]
+            pages = self.scan_pages(len(order), len(prefetched_columns), ring) #pinned until the page set is resolved, unless read through a ring
+            ring = getattr(pages, 'ring', None)
+            self.prefetch_page_sets(order[i+1:i+1+self.table.bufferpool.prefetch_depth], prefetched_columns, pages)
+            try:
+                base_page_index = page_set*(num_columns+4)
+                count = max(rid % max_records for rid in page_set_rids) + 1
+                indirections = self.read_page(base_page_index+INDIRECTION_COLUMN, True, pages).read_all(count)
+                timestamps = self.read_page(base_page_index+TIMESTAMP_COLUMN, True, pages).read_all(count)
+                schema_encodings = self.read_page(base_page_index+SCHEMA_ENCODING_COLUMN, True, pages).read_all(count)
+                base_columns = {} # key: column, value: base values of the page set
+                for rid in page_set_rids:
+                    j = rid % max_records
+                    if indirections[j] == -1 or indirections[j] < self.table.tps: # the base record is the only version
+                        if schema_encodings[j] == DELETED or not (mvcc.is_visible(timestamps[j]) if as_of is None else mvcc.is_visible_as_of(timestamps[j], as_of)):
+                            resolved[rid] = None
+                            continue
+                        for column in columns:
+                            if column not in base_columns:
+                                base_columns[column] = self.read_page(base_page_index+column+4, True, pages).read_all(count)
+                        resolved[rid] = [base_columns[column][j] for column in columns]
+                    else:
+                        if as_of is None:
+                            version = self.locate_version(rid, relative_version, pages)
+                        else:
+                            version = self.locate_as_of(rid, as_of, pages)
+                        if version is None:
+                            resolved[rid] = None
+                            continue
+                        values = self.read_version(version, projection, pages, True)
+                        resolved[rid] = [values[column] for column in columns]
+            finally:
+                self.release_pages(pages)
+        return [resolved[rid] for rid in rids]
+
+    """
+    :param function: string         # 'count', 'sum', 'min', 'max' or 'avg'
+    :param column: int              # Index of the column to aggregate
+    :param start: int               # Start of the primary key range to aggregate (None for no lower bound)
+    :param end: int                 # End of the primary key range to aggregate (None for no upper bound)
+    :param predicate: list          # (column, operator, value) conditions, see scan; used instead of the key range
+    :param group_by: int            # Index of the column to group by (None for a single group)
+    :param relative_version: the relative version of the records you need to aggregate.
+    # Returns the aggregate, or a dictionary of group value -> aggregate when group_by is given
+    # Returns None if no record is aggregated (an empty dictionary when grouping)
+    """
+    def aggregate(self, function, column, start=None, end=None, predicate=None, group_by=None, relative_version=0):
+        if function not in ('count', 'sum', 'min', 'max', 'avg'):
+            raise ValueError(f"Unknown aggregate function {function}.")
+        columns = [column] if group_by is None else [column, group_by]
+        if predicate is None:
+            rid_list = self.table.index.locate_range(self.table.key, start, end, self.reads_history(relative_version))
+            rows = []
+            for values in self.resolve_columns(rid_list, columns + [self.table.key], relative_version):
+                if values is not None and (start is None or start <= values[-1]) and (end is None or values[-1] <= end): #the version read still holds a key of the range
+                    rows.append(values[:-1])
+        else:
+            if relative_version != 0:
+                raise ValueError("Aggregates with a predicate only read the current version.")
+            projection = [1 if i in columns else 0 for i in range(self.table.num_columns)]
+            rows = []
+            for record in self.scan(predicate, projection):
+                values = dict(zip([i for i in range(self.table.num_columns) if projection[i] == 1], record.columns))
+                rows.append([values[i] for i in columns])
+        groups = {} # key: group value, value: [count, sum, min, max]
+        for values in rows:
+            if values is None:
+                continue
+            group = None if group_by is None else values[1]
+            value = values[0]
+            if group not in groups:
+                groups[group] = [0, 0, value, value]
+            state = groups[group]
+            state[0] += 1
+            state[1] += value
+            state[2] = min(state[2], value)
+            state[3] = max(state[3], value)
+        results = {}
+        for group, (count, total, minimum, maximum) in groups.items():
+            results[group] = {'count': count, 'sum': total, 'min': minimum, 'max': maximum, 'avg': total / count}[function]
+        if group_by is None:
+            return results.get(None)
+        return results
+
     """
     incremenets one column of the record
     this implementation should work if your select and update queries already work
@@ -2,6 +2,8 @@ from lstore.index import Index
 from lstore.page import Page
 from lstore.Bufferpool import BufferPool
 from lstore.lock import Lock, LockManager
+from lstore import mvcc
+from lstore.compression import SCHEMES
 from time import time
 import struct
 import os
@@ -17,26 +19,59 @@ RID_COLUMN = 1
 TIMESTAMP_COLUMN = 2
 SCHEMA_ENCODING_COLUMN = 3
 
+#schema encoding: bit i is set when data column i was updated (in the tail record itself, or by any tail record of a base record)
+#the slot is a signed 32-bit int: the sign bit is left to DELETED, so columns from SCHEMA_WIDTH-1 on share the last bit
+#(a non-cumulative tail record with that bit set holds all of those columns)
+DELETED = -1 #schema encoding of a deleted base record, and of the tail record written by a delete
+SCHEMA_WIDTH = 31
+
+def schema_bit(column):
+    return 1 << min(column, SCHEMA_WIDTH-1)
+
+def schema_bits(columns): #schema encoding of an update given as a list of new values (None for columns that don't change)
+    bits = 0
+    for i in range(len(columns)):
+        if columns[i] != None:
+            bits |= schema_bit(i)
+    return bits
+
+def column_updated(schema_encoding, column): #True if the schema encoding covers an update of column
+    return schema_encoding & schema_bit(column) != 0
+
 class Record:
+    __slots__ = ('rid', 'key', 'columns') #no per-instance __dict__, one Record is allocated for every row a query returns
 
     def __init__(self, rid, key, columns):
         self.rid = rid
         self.key = key
         self.columns = columns
 
+    def __getitem__(self, column): #record[i] is the i-th returned column
+        return self.columns[column]
+
+    def __repr__(self):
+        return f"Record(rid={self.rid}, key={self.key}, columns={self.columns})"
+
 class Table: 
 
     """
     :param name: string         #Table name
     :param num_columns: int     #Number of Columns: all columns are integer
     :param key: int             #Index of table key in columns
+    :param cumulative: bool     #tail records copy every column (True) or only hold the updated columns (False)
+    :param compression: dict    #key: data column, value: scheme its full base pages are compressed with on disk (one of compression.SCHEMES)
     """
-    def __init__(self, name, num_columns, key, path='none', bufferpool='none', load='none'):
+    def __init__(self, name, num_columns, key, path='none', bufferpool='none', load='none', cumulative=True, compression=None):
         self.name = name
         self.key = key
+        self.cumulative = cumulative
+        self.compression = dict(compression or {})
+        for scheme in self.compression.values():
+            if scheme not in SCHEMES:
+                raise ValueError(f"Unknown compression scheme {scheme}, expected one of {SCHEMES}.")
         self.num_columns = num_columns #excludes the 4 columns written above
         self.max_records = 64 #the max_records able to be stored in one page, this MUST mirror max_records from page class
-        self.lock_manager = LockManager()
+        self.lock_manager = LockManager(self.max_records)
         self.thread_lock = threading.Lock()
         self.update_thread_lock = threading.Lock()
         self.merge_thread_lock = threading.Lock()
@@ -75,22 +110,56 @@ class Table:
             self.index.create_index(i)
         self.total_tail_records = 0
         self.tps = 0 # INDEX FIX: Should be an array that represents each column
+        self.last_timestamp = 0 #value of the commit clock when the table was last closed
+        self.version_directory = {} # key: base rid, value: rids of its tail records from oldest to newest, so the k-th previous version is found without walking the chain
         pass
 
-    def init_page_dir(self): #adds one set of physical pages to the page_directory, in case the base pages have filled up or to initialize the page directory
+    def init_page_dir(self, pages=None): #adds one set of physical pages to the page_directory, in case the base pages have filled up or to initialize the page directory
         for i in range(self.num_columns+4):
             self.num_pages += 1
-            page = Page()
+            page = Page() if pages is None else pages[i] #pages may hold an already filled set of physical pages
             self.bufferpool.initPages(self.name, page, self.num_pages, True)
         pass
 
-    def init_tail_page_dir(self): #adds one set of physical pages to the tail_page_directory, in case the tail pages have filled up or to initialize the tail page directory
+    def init_tail_page_dir(self, pages=None): #adds one set of physical pages to the tail_page_directory, in case the tail pages have filled up or to initialize the tail page directory
         for i in range(self.num_columns+5):
             self.num_tail_pages += 1
-            page = Page()
+            page = Page() if pages is None else pages[i] #pages may hold an already filled set of physical pages
             self.bufferpool.initPages(self.name, page, self.num_tail_pages, False)
         pass
 
+    def timestamp_page_key(self, rid, is_base): #page holding the timestamp column of a base (is_base=True) or tail record
+        if is_base:
+            return (rid // self.max_records)*(self.num_columns+4)+TIMESTAMP_COLUMN
+        return (rid // self.max_records)*(self.num_columns+5)+TIMESTAMP_COLUMN
+
+    def latest_timestamp(self, rid): #timestamp of the newest version of the base record rid
+        base_page_index = (rid // self.max_records)*(self.num_columns+4)
+        indirection = self.bufferpool.get_page(self.name, base_page_index+INDIRECTION_COLUMN, True).read_val(rid)
+        if indirection == -1 or indirection < self.tps:
+            return self.bufferpool.get_page(self.name, base_page_index+TIMESTAMP_COLUMN, True).read_val(rid)
+        tail_page_index = (indirection // self.max_records)*(self.num_columns+5)
+        return self.bufferpool.get_page(self.name, tail_page_index+TIMESTAMP_COLUMN, False).read_val(indirection)
+
+    def add_version(self, rid, tail_rid): #records tail_rid as the newest version of base record rid
+        self.version_directory.setdefault(rid, []).append(tail_rid)
+
+    def remove_version(self, rid, tail_rid): #drops tail_rid from the version directory of base record rid once it left the chain (aborted update)
+        versions = self.version_directory.get(rid)
+        if versions and versions[-1] == tail_rid:
+            versions.pop()
+
+    def rebuild_schema_encoding(self, rid): #recomputes the schema encoding of base record rid from the tail records still in its chain
+        base_page_index = (rid // self.max_records)*(self.num_columns+4)
+        indirection = self.bufferpool.get_page(self.name, base_page_index+INDIRECTION_COLUMN, True).read_val(rid)
+        bits = 0
+        while indirection != -1 and indirection >= self.tps:
+            tail_page_index = (indirection // self.max_records)*(self.num_columns+5)
+            bits |= self.bufferpool.get_page(self.name, tail_page_index+SCHEMA_ENCODING_COLUMN, False).read_val(indirection)
+            indirection = self.bufferpool.get_page(self.name, tail_page_index+INDIRECTION_COLUMN, False).read_val(indirection)
+        with self.bufferpool.pinned_page(self.name, base_page_index+SCHEMA_ENCODING_COLUMN, True) as page:
+            page.overwrite(rid, bits)
+
     def __merge(self, current_tail_record):
         # print("merge is happening...") <-- if uncommented, this will print even on the first ever update
         # tail_records = self.tail_page_directory.copy() # BUFFERPOOL FIX: obtain copies from disk of all tail records
@@ -129,21 +198,24 @@ class Table:
                         base_page = base_page_copies[base_page_index + 4 + i]
                     else: # else retrieve it from disk
                         # base_page = self.page_directory[base_page_index + 4 + i].copy() #BUFFERPOOL FIX: obtain copy from disk 
-                        base_page = self.bufferpool.get_page_copy(self.name, base_page_index + 4 + i).copy()
+                        base_page = self.bufferpool.get_page_copy(self.name, base_page_index + 4 + i)
                         base_page_copies[base_page_index + 4 + i] = base_page
                     base_page.overwrite(base_rid, value)
 
                 # in place updated for metadata
+                schema_encoding = 0
+                if tail_records[tail_page_index + SCHEMA_ENCODING_COLUMN].read_val(tail_rid) == DELETED: # the latest tail record is a delete, the base record stays deleted
+                    schema_encoding = DELETED
                 if (base_page_index + 3) in base_page_copies: # if page has been stored, retrieve it from memory
-                    base_page_copies[base_page_index + 3].overwrite(base_rid, 0)
+                    base_page_copies[base_page_index + 3].overwrite(base_rid, schema_encoding)
                 else: # else retrieve it from disk
-                    base_page = self.bufferpool.get_page_copy(self.name, base_page_index + 3).copy()
+                    base_page = self.bufferpool.get_page_copy(self.name, base_page_index + 3)
                     # base_page = self.page_directory[base_page_index + 3].copy() #BUFFERPOOL FIX: obtain copy from disk 
                     base_page_copies[base_page_index + 3] = base_page
-                    base_page.overwrite(base_rid, 0)
+                    base_page.overwrite(base_rid, schema_encoding)
             updatedQueue.add(base_rid)
         for page_num in base_page_copies:
-            self.bufferpool.replace_page(self.name, page_num, base_page_copies[page_num])
+            self.bufferpool.replace_page(self.name, page_num, base_page_copies[page_num]) #written to disk later by the flusher or eviction
             # self.page_directory[page_num] = base_page_copies[page_num] #BUFFERPOOL FIX: push updated pages back into disk and bufferpool
         end = timer()
         # print(" merging should be done Total time Taken: ", Decimal(end - start).quantize(Decimal('0.01')), "seconds")
@@ -154,6 +226,7 @@ class Table:
         path = os.path.join(self.path, filename)
         self.index.thread_lock = None
         self.index.createIndex_thread_lock = None
+        self.last_timestamp = mvcc.clock.now() #commit timestamps stored in this table's records must stay in the past after reopening
         with open(path, 'wb') as f:
             pickle.dump(self, f) #dump all metadata, pagedirectory, and index 
     
@@ -167,5 +240,7 @@ class Table:
         self.__dict__.update(loaded_table.__dict__)
         # Re-bind bufferpool's reference to this table
         self.bufferpool.add_table(self.name, self)
+        self.index.table = self #the loaded index points to the unpickled copy of the table and its bufferpool
         self.index.thread_lock = threading.Lock()
-        self.index.createIndex_thread_lock = threading.Lock()        
+        self.index.createIndex_thread_lock = threading.Lock()
+        mvcc.clock.advance(self.last_timestamp)
@@ -1,6 +1,7 @@
-from lstore.table import Table, Record
+from lstore.table import Table, Record, INDIRECTION_COLUMN, SCHEMA_ENCODING_COLUMN, DELETED
 from lstore.index import Index
 from lstore.lock import LockManager
+from lstore import mvcc
 import threading
 
 class Transaction:
@@ -8,16 +9,19 @@ class Transaction:
     thread_lock = threading.Lock()
     """
     # Creates a transaction object.
+    :param snapshot_isolation: bool   #reads see a snapshot taken when the transaction starts and take no locks; False reads the latest version under shared locks
     """
-    def __init__(self):
+    def __init__(self, snapshot_isolation=True):
         self.queries = []
         self.held_locks = {}
+        self.snapshot_isolation = snapshot_isolation
         self.id = 0
         with Transaction.thread_lock:
             self.id = Transaction.id
             self.increment_id()
         #print("transaction with id ",self.id)
         self.commits = []
+        self.rids = [] #base rid written by each query, used to undo it on abort
         pass
 
     def increment_id(self):
@@ -33,127 +37,84 @@ class Transaction:
     def add_query(self, query, table, *args):
         self.queries.append((query, args, table))
         self.commits.append(0)
+        self.rids.append(None)
         # use grades_table for aborting
 
     # If you choose to implement this differently this method must still return True if transaction commits or False on abort
     def run(self):
         i = 0
+        mvcc.begin(self.id, self.snapshot_isolation)
         for query, args, table in self.queries:
             self.commits[i] = 2
-            if "table" in self.held_locks.keys(): #if a table lock is held by the transaction, all transactions will be able to get their locks by default, as the table lock won't be released until after commit
-                success = True
-
-            elif query.__name__ == 'select':
-                #print("select")
-                rids = table.index.locate(args[1], args[0])
-                success = table.lock_manager.acquire_read_locks(rids, self.id)
-                if not success:
-                    #print("cannot acquire S lock, another thread is writing") #PLEASE HANDLE THIS
-                    return self.abort()
-                for rid in rids:
-                    if rid not in self.held_locks:
-                        self.held_locks[rid] = []
-                    self.held_locks[rid].append('r')
-                
-            elif query.__name__ == 'select_version':
-                #print("select version")
-                rids = table.index.locate(args[1], args[0])
-                success = table.lock_manager.acquire_read_locks(rids, self.id)
-                if not success:
-                    #print("cannot acquire S lock, another thread is writing") #PLEASE HANDLE THIS
-                    return self.abort()
-                for rid in rids:
-                    if rid not in self.held_locks:
-                        self.held_locks[rid] = []
-                    self.held_locks[rid].append('r')
+            if self.snapshot_isolation and query.__name__ in ('select', 'select_version', 'select_iter', 'select_many', 'select_range_iter', 'scan', 'sum', 'sum_version', 'aggregate'):
+                pass #reads walk the version chains to the snapshot, no locks needed
 
-            elif query.__name__ == 'update':
-                #print("update")
-                key_col = table.key
-                rid = table.index.locate(key_col, args[0])
-                if rid == []:
-                    return self.abort()
-                rid_val = rid[0]
-                success = table.lock_manager.acquire_exclusive_lock(rid_val, self.id)
-                if success:
-                    if rid_val not in self.held_locks:
-                        self.held_locks[rid_val] = []
-                    self.held_locks[rid_val].append('w')
-                else:
-                    #print("could not obtain X lock, another thread is reading/writing") #PLEASE HANDLE THIS
-                    return self.abort()
+            elif query.__name__ == 'select_as_of' or query.__name__ == 'sum_as_of':
+                pass #reads committed versions only, which never change
 
-            elif query.__name__ == 'insert':
-                #probably need to look out for phantom reads or something
-                #check if table lock exists:
-                #print("insert")
-                success = table.lock_manager.block_table_lock(self.id)
-                if success:
-                    if "dynamic-state" not in self.held_locks:
-                        self.held_locks["dynamic-state"] = []
-                    self.held_locks["dynamic-state"].append('r')
+            elif query.__name__ == 'select' or query.__name__ == 'select_version' or query.__name__ == 'select_iter' or query.__name__ == 'select_many':
+                if query.__name__ == 'select_many':
+                    rids = [rid for key_rids in table.index.locate_many(args[1], args[0]) for rid in key_rids]
                 else:
-                    #print("could not insert, table lock exists") #PLEASE HANDLE THIS
+                    rids = table.index.locate(args[1], args[0])
+                granted = table.lock_manager.acquire_read_locks(rids, self.id) #IS on the table and page ranges, S on the records
+                if granted is False:
+                    #print("cannot acquire S lock, another thread is writing")
                     return self.abort()
-                
+                self.record_locks(granted)
 
-            elif query.__name__ == 'delete':
-                #probably need to check if any other thread is using it at the time of delete
-                #print("delete")
+            elif query.__name__ == 'update' or query.__name__ == 'delete' or query.__name__ == 'increment':
                 key_col = table.key
                 rid = table.index.locate(key_col, args[0])
                 if rid == []:
                     return self.abort()
                 rid_val = rid[0]
-                success = table.lock_manager.acquire_exclusive_lock(rid_val, self.id)
-                if success:
-                    args[0] = rid_val
-                    if rid_val not in self.held_locks:
-                        self.held_locks[rid_val] = []
-                    self.held_locks[rid_val].append('w')
-                else:
-                    #print("could not obtain X lock, another thread is reading/writing") #PLEASE HANDLE THIS
+                granted = table.lock_manager.acquire_exclusive_lock(rid_val, self.id) #IX on the table and page range, X on the record
+                if granted is False:
+                    #print("could not obtain X lock, another thread is reading/writing")
                     return self.abort()
-
-            elif query.__name__ == 'sum': #scanning operation
-                #print("sum")
-                success = table.lock_manager.acquire_table_lock(self.id)
-                if not success:
-                    #print("cannot acquire scanning lock on table, outside transactions are holding locks") #PLEASE HANDLE THIS
+                self.record_locks(granted)
+                if self.snapshot_isolation and table.latest_timestamp(rid_val) > mvcc.snapshot(): #first committer wins: the record changed after our snapshot
                     return self.abort()
-                self.held_locks["table"] = ['w']
+                self.rids[i] = rid_val
 
-            elif query.__name__ == 'sum_version': #scanning operation
-                #print("sum version")
-                success = table.lock_manager.acquire_table_lock(self.id)
-                if not success:
-                    #print("cannot acquire scanning lock on table, outside transactions are holding locks") #PLEASE HANDLE THIS
+            elif query.__name__ == 'update_many':
+                key_rids = table.index.locate_many(table.key, [key for key, columns in args[0]])
+                if [] in key_rids:
+                    return self.abort()
+                rids = [key_rid[0] for key_rid in key_rids]
+                granted = table.lock_manager.acquire_exclusive_locks(rids, self.id) #IX on the table and page ranges, X on every record, all or none
+                if granted is False:
+                    return self.abort()
+                self.record_locks(granted)
+                if self.snapshot_isolation and any(table.latest_timestamp(rid) > mvcc.snapshot() for rid in set(rids)):
                     return self.abort()
-                self.held_locks["table"] = ['w']
+                self.rids[i] = rids
 
-            elif query.__name__ == 'increment':
-                key_col = table.key
-                rid = table.index.locate(key_col, args[0])
-                if rid == []:
+            elif query.__name__ == 'insert' or query.__name__ == 'insert_many':
+                granted = table.lock_manager.acquire_insert_lock(self.id) #IX on the table so scans of the table wait for the insert to commit
+                if granted is False:
+                    #print("could not insert, a scan holds the table")
                     return self.abort()
-                rid_val = rid[0]
-                success = table.lock_manager.acquire_exclusive_lock(rid_val, self.id)
-                if success:
-                    args[0] = rid_val
-                    if rid_val not in self.held_locks:
-                        self.held_locks[rid_val] = []
-                    self.held_locks[rid_val].append('w')
-                else:
-                    #print("could not obtain X lock, another thread is reading/writing") #PLEASE HANDLE THIS
+                self.record_locks(granted)
+
+            elif query.__name__ in ('sum', 'sum_version', 'aggregate', 'select_range_iter', 'scan'): #scanning operation
+                rids = self.scanned_rids(query.__name__, args, table)
+                granted = table.lock_manager.acquire_range_locks(rids, self.id) #S on the page ranges holding the key range, updates outside of them can still run
+                if granted is False:
+                    #print("cannot acquire scanning lock, outside transactions are writing to the range")
                     return self.abort()
+                self.record_locks(granted)
 
             else:
                 #print("Nothing....")
                 pass
 
             result = True
-            if query.__name__ == 'insert':
-                result = query(*args, self.id)
+            if query.__name__ == 'insert' or query.__name__ == 'insert_many':
+                result = query(*args, t_id=self.id)
+            elif query.__name__ in ('select_iter', 'select_range_iter', 'scan'): #generators, the records are read now while the transaction holds its locks or snapshot
+                result = list(query(*args))
             else:
                 result = query(*args)
             # If the query has failed the transaction should abort
@@ -163,78 +124,106 @@ class Transaction:
             if query.__name__ == 'insert':
                 key_col = table.key
                 rid = table.index.locate(key_col, args[key_col])[0]
-                self.held_locks[rid] = []
-                self.held_locks[rid].append('w')
+                self.record_locks(table.lock_manager.acquire_exclusive_lock(rid, self.id)) #already granted during the insert, records it for release
+                self.rids[i] = rid
+            elif query.__name__ == 'insert_many':
+                rids = [key_rid[0] for key_rid in table.index.locate_many(table.key, [row[table.key] for row in args[0]])]
+                for rid in rids:
+                    self.record_locks(table.lock_manager.acquire_exclusive_lock(rid, self.id)) #already granted during the insert, records them for release
+                self.rids[i] = rids
 
             self.commits[i] = 1
             i += 1
             
         return self.commit()
 
+    def scanned_rids(self, name, args, table): #base rids whose page ranges a scanning query reads (every record for a predicate scan)
+        if name == 'sum' or name == 'sum_version':
+            return table.index.locate_range(table.key, args[0], args[1])
+        if name == 'select_range_iter':
+            return table.index.locate_range(args[2], args[0], args[1], removed=True) #older versions of the range include deleted records
+        if name == 'aggregate' and (len(args) < 5 or args[4] is None): #key range of the aggregate, None bounds are open
+            return table.index.locate_range(table.key, args[2] if len(args) > 2 else None, args[3] if len(args) > 3 else None, removed=True)
+        return range(table.rid)
+
+    def record_locks(self, granted):
+        for resource, mode in granted:
+            if resource not in self.held_locks:
+                self.held_locks[resource] = []
+            self.held_locks[resource].append(mode)
+
+    def release_locks(self):
+        for query, args, table in self.queries: 
+            table.lock_manager.release_all_locks(self.held_locks, self.id)
+        self.held_locks = {}
+
     
     def abort(self):
         #print(self.id, "abort is happening ////////////////////////////////////")
         i = len(self.commits)-1
         for query, args, table in reversed(self.queries):
-            if self.commits[i] == 1 or self.commits[i] == 0:
-                pass
-            elif query.__name__ == 'insert':
-                key_col = table.key
-                rid = table.index.locate(key_col, args[key_col])
-                if rid!=[]:
-                    rid = rid[0]
-                    record = self.select_record(args[key_col], key_col, [1]*table.num_columns)[0]
-                    for i in range(len(record)):
-                        table.index.delete_index(i, record[i], rid)
-            elif query.__name__ == 'update':
-                key_col = table.key
-                primary_key = args[key_col] #must deference args this way in case primary_key was changed
-                if primary_key==None:
-                    primary_key = args[0]
-                rid = table.index.locate(key_col, primary_key)[0]
-                max_records = table.max_records
-                page_set = rid // max_records 
-                tail_rid = table.bufferpool.get_page(table.name, page_set*(table.num_columns+4), True).read_val(rid)
-                tail_page_num = (tail_rid // max_records)*(table.num_columns+5)
-                prev_version_rid = table.bufferpool.get_page(table.name, tail_page_num, False).read_val(tail_rid)  
-                table.bufferpool.get_page(table.name, page_set*(table.num_columns+4), True).overwrite(rid, prev_version_rid)
-                data = table.select_record_version(primary_key, key_col, [1]*table.num_columns, -1)[0].columns
-                #print("reverting back to ", data)
-                for i in range(len(data)):
-                    if (table.index.indices[i] != None and args[i+1] != None):
-                        table.index.delete_index(i, data[i], rid)
-                        table.index.add_index(i, data[i], rid)
-            elif query.__name__ == 'delete':
-                rid =  args[0]
-                max_records = table.max_records
-                page_number = rid // max_records
-                self.table.bufferpool.get_page(self.table.name, page_number * (self.table.num_columns + 4) + 2, True).overwrite(rid, 0)
-                data = []
-                for i in range(len(table.num_columns)):
-                    data.append(self.table.bufferpool.get_page(self.table.name, page_number * (self.table.num_columns + 4) + 4 +i, True).read_val(rid))
-                    if table.index.indices[i] != None:
-                        table.index.add_index(i, data[i], rid)
-            elif query.__name__ == 'increment': #increment simply creates an update/tail record but the arguments passed are different than those of the update function
-                key_col = table.key
-                rid = args[0]
-                max_records = table.max_records
-                page_set = rid // max_records 
-                tail_rid = table.bufferpool.get_page(table.name, page_set*(table.num_columns+4), True).read_val(rid)
-                tail_page_num = (tail_rid // max_records)*(table.num_columns+5)
-                prev_version_rid = self.bufferpool.get_page(self.name, tail_page_num, False).read_val(tail_rid)
-                incremented_data = self.bufferpool.get_page(self.name, tail_page_num+3+args[1], False).read_val(tail_rid)   
-                table.bufferpool.get_page(table.name, page_set*(table.num_columns+4), True).overwrite(prev_version_rid)
-                if (table.index.indices[args[1]] != None):
-                    table.index.delete_index(args[1], incremented_data, rid)
-                    table.index.add_index(args[1], incremented_data-1, rid)
+            if self.commits[i] == 1 and self.rids[i] != None: #only the writes that ran before the failing query changed the table
+                self.undo(query, args, table, self.rids[i])
+            self.commits[i] = 0
             i -= 1
-        for query, args, table in self.queries: 
-            table.lock_manager.release_all_locks(self.held_locks, self.id)
+        mvcc.end()
+        self.release_locks()
         return False
 
+    def undo(self, query, args, table, rid): #rid is the list of base rids of the rows for insert_many and update_many
+        q = query.__self__ #Query object the query was added from
+        if query.__name__ == 'insert':
+            self.undo_insert(table, args, rid)
+        elif query.__name__ == 'insert_many':
+            rows = list(args[0])
+            for j in range(len(rid)):
+                self.undo_insert(table, rows[j], rid[j])
+        elif query.__name__ == 'update' or query.__name__ == 'increment': #increment simply creates an update/tail record but the arguments passed are different than those of the update function
+            if query.__name__ == 'update':
+                changed_columns = [i for i in range(table.num_columns) if args[i+1] != None]
+            else:
+                changed_columns = [args[1]]
+            self.undo_update(q, table, rid, changed_columns)
+        elif query.__name__ == 'update_many': #the tail records of the batch are the newest versions, undone from the last one
+            updates = list(args[0])
+            for j in reversed(range(len(updates))):
+                self.undo_update(q, table, rid[j], [i for i in range(table.num_columns) if updates[j][1][i] != None])
+        elif query.__name__ == 'delete': #removes the tail record of the delete, then puts the record back in the indexes
+            self.undo_update(q, table, rid, [])
+            data = q.read_version(q.locate_version(rid), [1]*table.num_columns)
+            for i in range(table.num_columns):
+                if table.index.indices[i] != None:
+                    table.index.add_index(i, data[i], rid)
+
+    def undo_insert(self, table, columns, rid):
+        base_page_index = (rid // table.max_records)*(table.num_columns+4)
+        for i in range(table.num_columns):
+            table.index.delete_index(i, columns[i], rid)
+        with table.bufferpool.pinned_page(table.name, base_page_index+SCHEMA_ENCODING_COLUMN, True) as page:
+            page.overwrite(rid, DELETED) #the base record stays as a deleted record
+
+    def undo_update(self, q, table, rid, changed_columns): #removes the newest tail record of rid
+        max_records = table.max_records
+        base_page_index = (rid // max_records)*(table.num_columns+4)
+        tail_rid = table.bufferpool.get_page(table.name, base_page_index+INDIRECTION_COLUMN, True).read_val(rid)
+        tail_page_index = (tail_rid // max_records)*(table.num_columns+5)
+        prev_version_rid = table.bufferpool.get_page(table.name, tail_page_index+INDIRECTION_COLUMN, False).read_val(tail_rid)
+        new_data = q.read_version((tail_rid, False), [1]*table.num_columns)
+        if prev_version_rid == -1:
+            old_data = q.read_version((rid, True), [1]*table.num_columns)
+        else:
+            old_data = q.read_version((prev_version_rid, False), [1]*table.num_columns)
+        with table.bufferpool.pinned_page(table.name, base_page_index+INDIRECTION_COLUMN, True) as page:
+            page.overwrite(rid, prev_version_rid)
+        table.remove_version(rid, tail_rid)
+        table.rebuild_schema_encoding(rid)
+        for i in changed_columns:
+            table.index.delete_index(i, new_data[i], rid)
+            table.index.add_index(i, old_data[i], rid)
+
     
     def commit(self):
         #print(self.id, " committed ")
-        for query, args, table in self.queries: 
-            table.lock_manager.release_all_locks(self.held_locks, self.id)
+        mvcc.commit()
+        self.release_locks()
         return True
@@ -0,0 +1,130 @@
+from concurrent.futures import Future
+from lstore import mvcc
+from collections import deque
+import heapq
+import random
+import threading
+import time
+
+class TransactionPool:
+    """
+    # Runs transactions on a fixed set of threads shared by every TransactionWorker
+    # each thread has its own queue of transactions and steals from the other queues once its own is empty
+    :param num_threads: int       #number of threads running transactions
+    :param max_retries: int       #aborted transactions are given up on after this many retries (None retries until they commit)
+    :param backoff_base: float    #seconds to wait before the first retry, doubled on every following abort of the same transaction
+    :param backoff_cap: float     #upper bound of the wait between two attempts
+    """
+    def __init__(self, num_threads=8, max_retries=None, backoff_base=0.0005, backoff_cap=0.05):
+        self.num_threads = num_threads
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.queues = [deque() for i in range(num_threads)] #entries: (future, number of aborts so far, transaction, stats, (max_retries, backoff_base, backoff_cap))
+        self.retries = [] #heap of (time the transaction may run again, order added, entry)
+        self.order = 0
+        self.next_queue = 0
+        self.condition = threading.Condition()
+        self.threads = []
+        for i in range(num_threads):
+            thread = threading.Thread(target=self.__run, args=(i,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    """
+    # Queues a transaction
+    # Returns a Future resolved with True once the transaction commits, or False if it was given up on after max_retries
+    # if a query raises, the transaction is aborted and the Future holds the exception
+    # stats, if given, is a TransactionWorker stats dictionary updated with the outcome
+    # max_retries, backoff_base and backoff_cap override the settings of the pool for this transaction, None keeps them
+    """
+    def submit(self, transaction, stats=None, max_retries=None, backoff_base=None, backoff_cap=None):
+        future = Future()
+        policy = (self.max_retries if max_retries is None else max_retries,
+                  self.backoff_base if backoff_base is None else backoff_base,
+                  self.backoff_cap if backoff_cap is None else backoff_cap)
+        with self.condition:
+            self.queues[self.next_queue].append((future, 0, transaction, stats, policy))
+            self.next_queue = (self.next_queue + 1) % self.num_threads
+            self.condition.notify()
+        return future
+
+    """
+    Returns how long to wait before running a transaction that aborted `attempts` times
+    exponential backoff with full jitter so transactions fighting over the same records don't retry in lockstep
+    """
+    def backoff(self, attempts, backoff_base=None, backoff_cap=None):
+        backoff_base = self.backoff_base if backoff_base is None else backoff_base
+        backoff_cap = self.backoff_cap if backoff_cap is None else backoff_cap
+        delay = min(backoff_cap, backoff_base * (2 ** (attempts - 1)))
+        return random.uniform(0, delay)
+
+    def __next_entry(self, i): #must be called holding self.condition, returns the next entry for thread i or None
+        if len(self.retries) != 0 and self.retries[0][0] <= time.monotonic():
+            return heapq.heappop(self.retries)[2]
+        if len(self.queues[i]) != 0:
+            return self.queues[i].popleft()
+        for j in range(1, self.num_threads): #steal from the end of the other queues
+            queue = self.queues[(i + j) % self.num_threads]
+            if len(queue) != 0:
+                return queue.pop()
+        return None
+
+    def __run(self, i):
+        while True:
+            with self.condition:
+                entry = self.__next_entry(i)
+                while entry is None:
+                    timeout = None
+                    if len(self.retries) != 0:
+                        timeout = max(0, self.retries[0][0] - time.monotonic())
+                    self.condition.wait(timeout)
+                    entry = self.__next_entry(i)
+            future, attempts, transaction, stats, policy = entry
+            max_retries, backoff_base, backoff_cap = policy
+            # each transaction returns True if committed or False if aborted
+            try:
+                has_committed = transaction.run()
+            except Exception as error:
+                self.__fail(transaction, future, stats, error)
+                continue
+            with self.condition:
+                if has_committed:
+                    if stats != None:
+                        stats["commits"] += 1
+                        stats["retries"][attempts] = stats["retries"].get(attempts, 0) + 1
+                    future.set_result(True)
+                    continue
+                attempts += 1
+                if stats != None:
+                    stats["aborts"] += 1
+                if max_retries != None and attempts > max_retries:
+                    if stats != None:
+                        stats["failed"] += 1
+                    future.set_result(False)
+                    continue
+                heapq.heappush(self.retries, (time.monotonic() + self.backoff(attempts, backoff_base, backoff_cap), self.order, (future, attempts, transaction, stats, policy)))
+                self.order += 1
+                self.condition.notify()
+
+    def __fail(self, transaction, future, stats, error): #a query raised, the thread must survive it and the Future must be resolved
+        try:
+            transaction.abort() #undoes the queries that ran, releases the locks and ends the mvcc context of this thread
+        except Exception:
+            mvcc.end()
+            transaction.release_locks()
+        finally:
+            with self.condition:
+                if stats != None:
+                    stats["failed"] += 1
+            future.set_exception(error)
+
+shared_pool = None
+shared_pool_lock = threading.Lock()
+
+def get_shared_pool():
+    global shared_pool
+    with shared_pool_lock:
+        if shared_pool is None:
+            shared_pool = TransactionPool()
+        return shared_pool
@@ -1,18 +1,26 @@
 from lstore.table import Table, Record
 from lstore.index import Index
-import threading
+from lstore.transaction_pool import get_shared_pool
 
 class TransactionWorker:
     """
     # Creates a transaction worker object.
+    # the transactions are run by a TransactionPool (the pool shared by every worker unless one is given)
+    :param max_retries: int       #aborted transactions are given up on after this many retries (None keeps the setting of the pool, the shared pool retries until they commit)
+    :param backoff_base: float    #seconds to wait before the first retry, doubled on every following abort of the same transaction (None keeps the setting of the pool)
+    :param backoff_cap: float     #upper bound of the wait between two attempts (None keeps the setting of the pool)
     """
-    def __init__(self, transactions = None):
-        self.stats = []
+    def __init__(self, transactions = None, max_retries=None, backoff_base=None, backoff_cap=None, pool = None):
+        self.stats = {"commits": 0, "aborts": 0, "failed": 0, "retries": {}} #retries: key: number of retries a transaction needed before committing, value: number of transactions
         self.result = 0
         self.transactions = []
         if (transactions != None):
             self.transactions = transactions
-        self.thread = None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.pool = pool
+        self.futures = []
         pass
 
     """
@@ -21,34 +29,32 @@ class TransactionWorker:
     def add_transaction(self, t):
         self.transactions.append(t)
 
-        
+
     """
-    Runs all transaction as a thread
+    Submits all transactions to the pool
     """
     def run(self):
-        #print("run thread")
-        self.thread = threading.Thread(target=self.__run, args=())
-        self.thread.start()
-        # here you need to create a thread and call __run
-    
+        if self.pool is None:
+            self.pool = get_shared_pool()
+        self.futures = [(t, self.pool.submit(t, self.stats, self.max_retries, self.backoff_base, self.backoff_cap)) for t in self.transactions]
+
 
     """
     Waits for the worker to finish
+    re-raises the first exception raised by a query once every transaction is done
     """
     def join(self):
-        self.thread.join()
-        #print("end thread")
-
-
-    def __run(self):
-        while len(self.transactions)!=0:
-            aborted_transactions = []
-            for transaction in self.transactions:
-                # each transaction returns True if committed or False if aborted
-                has_committed = transaction.run()
-                self.stats.append(has_committed)
-                if has_committed == False:
-                    aborted_transactions.append(transaction)
-            # stores the number of transactions that committed
-            self.result = len(list(filter(lambda x: x, self.stats)))
-            self.transactions = aborted_transactions
\ No newline at end of file
+        failed = []
+        error = None
+        for t, future in self.futures:
+            if future.exception() is not None:
+                failed.append(t)
+                error = error or future.exception()
+            elif future.result() == False:
+                failed.append(t)
+        self.futures = []
+        # stores the number of transactions that committed
+        self.result = self.stats["commits"]
+        self.transactions = failed
+        if error is not None:
+            raise error
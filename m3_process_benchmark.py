@@ -0,0 +1,89 @@
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+from lstore.transaction_worker import TransactionWorker
+from lstore.process_pool import ProcessPool
+
+from random import randint, seed
+from timeit import default_timer as timer
+import shutil
+
+# m3 tester workload (select + update transactions) run on TransactionWorker threads and on ProcessPool processes
+# the guard keeps the partition processes from re-running the benchmark on platforms that spawn them
+if __name__ == '__main__':
+    number_of_records = 1000
+    number_of_transactions = 100
+    number_of_operations_per_record = 2
+    num_threads = 8
+    num_processes = 4
+
+    seed(3562901)
+    keys = []
+    records = {}
+    for i in range(0, number_of_records):
+        key = 92106429 + i
+        keys.append(key)
+        records[key] = [key, randint(i * 20, (i + 1) * 20), randint(i * 20, (i + 1) * 20), randint(i * 20, (i + 1) * 20), randint(i * 20, (i + 1) * 20)]
+
+    # the same transactions for both modes: a list of (query name, *args) per transaction
+    workload = [[] for i in range(number_of_transactions)]
+    for j in range(number_of_operations_per_record):
+        for key in keys:
+            updated_columns = [None, None, None, None, None]
+            for i in range(2, 5):
+                updated_columns[i] = randint(0, 20)
+                workload[key % number_of_transactions].append(('select', key, 0, [1, 1, 1, 1, 1]))
+                workload[key % number_of_transactions].append(('update', key, *updated_columns))
+
+
+    # threads
+    shutil.rmtree('./PB_threads', ignore_errors=True)
+    try:
+        db = Database()
+        db.open('./PB_threads')
+        grades_table = db.create_table('Grades', 5, 0)
+        query = Query(grades_table)
+        for key in keys:
+            query.insert(*records[key])
+
+        transaction_workers = [TransactionWorker() for i in range(num_threads)]
+        for i in range(number_of_transactions):
+            t = Transaction()
+            for query_name, *args in workload[i]:
+                t.add_query(getattr(query, query_name), grades_table, *args)
+            transaction_workers[i % num_threads].add_transaction(t)
+
+        start = timer()
+        for worker in transaction_workers:
+            worker.run()
+        for worker in transaction_workers:
+            worker.join()
+        end = timer()
+        thread_time = end - start
+        print("Threads   (", num_threads, "workers):  \t", round(thread_time, 2), "seconds,", round(len(keys)*number_of_operations_per_record*6/thread_time), "queries/second")
+        db.close()
+    finally:
+        shutil.rmtree('./PB_threads', ignore_errors=True)
+
+
+    # processes
+    shutil.rmtree('./PB_processes', ignore_errors=True)
+    try:
+        pool = ProcessPool('./PB_processes', num_processes)
+        pool.create_table('Grades', 5, 0)
+        for key in keys:
+            pool.add_transaction([('insert', 'Grades', *records[key])])
+        pool.run()
+
+        for i in range(number_of_transactions):
+            pool.add_transaction([(query_name, 'Grades', *args) for query_name, *args in workload[i]])
+
+        start = timer()
+        committed = pool.run()
+        end = timer()
+        process_time = end - start
+        print("Processes (", num_processes, "workers):  \t", round(process_time, 2), "seconds,", round(len(keys)*number_of_operations_per_record*6/process_time), "queries/second")
+        print("Committed", committed, "/", number_of_transactions, "transactions, speedup", round(thread_time/process_time, 2), "x")
+        pool.close()
+    finally:
+        shutil.rmtree('./PB_processes', ignore_errors=True)
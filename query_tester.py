@@ -0,0 +1,158 @@
+from lstore.db import Database
+from lstore.query import Query
+
+from random import choice, randint, sample, seed
+import shutil
+import os
+
+db = Database()
+db.open('./QT')
+# Create a table  with 5 columns
+#   Student Id and 4 grades, columns 1-4 compressed on disk with each scheme
+grades_table = db.create_table('Grades', 5, 0, compression={1: 'bitpack', 2: 'for', 3: 'delta', 4: 'rle'})
+
+# create a query class for the grades table
+query = Query(grades_table)
+
+# dictionary for records to test the database: test directory
+records = {}
+versions = {} # key: primary key, value: the previous versions of the record, oldest first
+
+number_of_records = 1000
+number_of_csv_records = 500
+number_of_aggregates = 20
+number_of_updates = 300
+
+seed(3562901)
+
+def new_record(key, i): # values each compression scheme packs well, and some it doesn't
+    return [key, randint(0, 20), randint(-1000, 1000) if i % 97 == 0 else randint(5000, 5040), 3*i + randint(0, 2), choice([7, 7, 7, 8]) if i % 200 < 150 else randint(0, 2**20)]
+
+# insert_many in batches, one batch with a short row is rejected
+rows = []
+for i in range(0, number_of_records):
+    key = 92106429 + i
+    records[key] = new_record(key, i)
+    versions[key] = []
+    rows.append(records[key])
+for i in range(0, number_of_records, 256):
+    if not query.insert_many(rows[i: i + 256]):
+        print('insert_many error on rows', i, 'to', i + 255)
+if query.insert_many([[92106429 + 2*number_of_records, 1, 2, 3, 4], [92106429 + 2*number_of_records + 1, 1, 2, 3]]):
+    print('insert_many error: inserted a short row')
+if query.select(92106429 + 2*number_of_records, 0, [1, 1, 1, 1, 1]) != []:
+    print('insert_many error: a row of a rejected batch was inserted')
+
+# insert_csv with a header line
+path = './QT_grades.csv' # outside of the database directory, open reads every file there as a table
+with open(path, 'w') as f:
+    f.write('id,g1,g2,g3,g4\n')
+    for i in range(number_of_records, number_of_records + number_of_csv_records):
+        key = 92106429 + i
+        records[key] = new_record(key, i)
+        versions[key] = []
+        f.write(','.join(str(value) for value in records[key]) + '\n')
+if not query.insert_csv(path, skip_header=True, batch_size=128):
+    print('insert_csv error')
+keys = sorted(list(records.keys()))
+for key in keys:
+    result = query.select(key, 0, [1, 1, 1, 1, 1])
+    if len(result) != 1 or result[0].columns != records[key]:
+        print('select error on', key, ':', result, ', correct:', records[key])
+print("Insert finished")
+
+# update_many with keys repeated in the batch, the last update of a key wins and each one is a version
+for _ in range(number_of_updates // 30):
+    batch = []
+    for key in [choice(keys) for _ in range(20)] + [choice(keys[:10]) for _ in range(10)]:
+        updated_columns = [None, None, None, None, None]
+        for column in sample(range(1, 5), randint(1, 2)):
+            updated_columns[column] = randint(0, 20)
+        versions[key].append(list(records[key]))
+        for column in range(1, 5):
+            if updated_columns[column] is not None:
+                records[key][column] = updated_columns[column]
+        batch.append((key, updated_columns))
+    if not query.update_many(batch):
+        print('update_many error on', batch)
+if query.update_many([(keys[0], [None, 1, None, None, None]), (-1, [None, 1, None, None, None])]):
+    print('update_many error: updated a missing key')
+
+def check_versions(query):
+    for key in keys:
+        record = query.select(key, 0, [1, 1, 1, 1, 1])[0]
+        if record.columns != records[key]:
+            print('select error on', key, ':', record.columns, ', correct:', records[key])
+        for version in [-1, -2]:
+            correct = versions[key][version] if len(versions[key]) >= -version else versions[key][0] if versions[key] else records[key]
+            record = query.select_version(key, 0, [1, 1, 1, 1, 1], version)[0]
+            if record.columns != correct:
+                print('select_version', version, 'error on', key, ':', record.columns, ', correct:', correct)
+check_versions(query)
+print("Update finished")
+
+# select_many returns the records of each search key in the order of the keys, [] for a missing key
+def check_select_many(query):
+    for _ in range(number_of_aggregates):
+        search_keys = sample(keys, 10) + [-1, keys[0]]
+        result = query.select_many(search_keys, 0, [1, 0, 1, 0, 1])
+        correct = [[[key, records[key][2], records[key][4]]] if key in records else [] for key in search_keys]
+        if [[record.columns for record in records_of_key] for records_of_key in result] != correct:
+            print('select_many error on', search_keys, ':', result, ', correct:', correct)
+    search_keys = list(range(21, -2, -1))
+    result = query.select_many(search_keys, 1, [1, 1, 1, 1, 1])
+    for value, records_of_value in zip(search_keys, result):
+        correct = sorted(key for key in keys if records[key][1] == value)
+        if sorted(record.columns[0] for record in records_of_value) != correct:
+            print('select_many error on column 1 =', value, ':', len(records_of_value), 'records, correct:', len(correct))
+
+# scan and aggregate, checked against the records dictionary
+def check_aggregates(query):
+    functions = {'count': len, 'sum': sum, 'min': min, 'max': max, 'avg': lambda values: sum(values) / len(values)}
+    for _ in range(number_of_aggregates):
+        r = sorted(sample(range(0, len(keys)), 2))
+        column = randint(1, 4)
+        group_by = randint(1, 4)
+        predicate = [(randint(1, 4), choice(['==', '!=', '<', '<=', '>', '>=']), randint(0, 20)), (choice([1, 3]), '<=', randint(10, 2000))]
+        range_keys = keys[r[0]: r[1] + 1]
+        matching_keys = [key for key in keys if all({'==': records[key][c] == v, '!=': records[key][c] != v, '<': records[key][c] < v, '<=': records[key][c] <= v, '>': records[key][c] > v, '>=': records[key][c] >= v}[op] for c, op, v in predicate)]
+        result = sorted(record.columns[0] for record in query.scan(predicate, [1, 0, 0, 0, 0]))
+        if result != matching_keys:
+            print('scan error on', predicate, ':', len(result), 'records, correct:', len(matching_keys))
+        for function in ['count', 'sum', 'min', 'max', 'avg']:
+            for aggregate_keys, start, end, aggregate_predicate in [(range_keys, keys[r[0]], keys[r[1]], None), (keys, None, None, None), (matching_keys, None, None, predicate)]:
+                values = [records[key][column] for key in aggregate_keys]
+                correct = functions[function](values) if values else None
+                result = query.aggregate(function, column, start, end, aggregate_predicate)
+                if result != correct:
+                    print('aggregate', function, 'error on [', start, ',', end, '] predicate', aggregate_predicate, ':', result, ', correct:', correct)
+                groups = {}
+                for key in aggregate_keys:
+                    groups.setdefault(records[key][group_by], []).append(records[key][column])
+                correct = {group: functions[function](group_values) for group, group_values in groups.items()}
+                result = query.aggregate(function, column, start, end, aggregate_predicate, group_by)
+                if result != correct:
+                    print('aggregate', function, 'group by', group_by, 'error on [', start, ',', end, '] predicate', aggregate_predicate, ':', result, ', correct:', correct)
+    if query.aggregate('max', 1, keys[-1] + 1, keys[-1] + 10) is not None or query.aggregate('count', 1, keys[-1] + 1, None, None, 2) != {}:
+        print('aggregate error on an empty key range')
+
+check_select_many(query)
+check_aggregates(query)
+print("Aggregate finished")
+
+# the compressed base pages are written on close, the reopened table reads them back
+db.close()
+db = Database()
+db.open('./QT')
+grades_table = db.get_table('Grades')
+query = Query(grades_table)
+grades_table.index.drop_index(0) # rebuilt from the compressed base pages, the primary key is never updated
+grades_table.index.create_index(0)
+check_versions(query)
+check_select_many(query)
+check_aggregates(query)
+print("Reopen finished")
+
+db.close()
+shutil.rmtree('./QT', ignore_errors=True)
+os.remove(path)
@@ -0,0 +1,41 @@
+from lstore.db import Database
+from lstore.query import Query
+from lstore.table import Record
+from timeit import default_timer as timer
+import tracemalloc
+import shutil
+
+# Memory and time of 100k-row selects with the slotted Record, compared to a plain class with a __dict__
+
+class DictRecord:
+
+    def __init__(self, rid, key, columns):
+        self.rid = rid
+        self.key = key
+        self.columns = columns
+
+number_of_records = 100000
+
+shutil.rmtree('./RB', ignore_errors=True)
+db = Database()
+try:
+    db.open('./RB')
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    query.insert_many([i, i % 100, 0, 0, 0] for i in range(number_of_records))
+
+    start = timer()
+    records = list(query.select_range_iter(0, number_of_records - 1, 0, [1, 1, 1, 1, 1]))
+    end = timer()
+    print("Selecting 100k records took:  \t\t\t", round(end - start, 2), "seconds")
+
+    for record_class in (Record, DictRecord):
+        tracemalloc.start()
+        copies = [record_class(r.rid, r.key, r.columns) for r in records]
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(record_class.__name__, "\t100k records use:  \t\t", round(size / 2**20, 2), "MiB")
+        del copies
+    db.close()
+finally:
+    shutil.rmtree('./RB', ignore_errors=True)
@@ -0,0 +1,240 @@
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+from lstore import mvcc
+
+from random import choice, randint, sample, seed
+import threading
+import shutil
+
+db = Database()
+db.open('./ST')
+# Create a table  with 5 columns
+#   Student Id and 4 grades
+#   The first argument is name of the table
+#   The second argument is the number of columns
+#   The third argument is determining the which columns will be primay key
+#       Here the first column would be student id and primary key
+grades_table = db.create_table('Grades', 5, 0)
+
+# create a query class for the grades table
+query = Query(grades_table)
+
+# dictionary for records to test the database: test directory
+records = {}
+
+number_of_records = 1000
+number_of_aggregates = 100
+number_of_updates = 300
+number_of_deletes = 50
+
+seed(3562901)
+
+# a transaction that reaches the pause query waits there until resume is set, the main thread runs other queries meanwhile
+class Pause:
+    def __init__(self):
+        self.reached = threading.Event()
+        self.resume = threading.Event()
+
+    def pause(self):
+        self.reached.set()
+        self.resume.wait()
+        return True
+
+def start_paused(transaction, pause): # runs the transaction on its own thread until it reaches its pause query
+    results = []
+    thread = threading.Thread(target=lambda: results.append(transaction.run()))
+    thread.start()
+    pause.reached.wait()
+    return thread, results
+
+def finish(thread, results, pause): # lets the paused transaction run to the end, returns True if it committed
+    pause.resume.set()
+    thread.join()
+    return results[0]
+
+def run_alone(*queries, snapshot_isolation=True): # runs a transaction of (query, *args) tuples, returns True if it committed
+    transaction = Transaction(snapshot_isolation)
+    for query_args in queries:
+        transaction.add_query(query_args[0], grades_table, *query_args[1:])
+    return transaction.run()
+
+# queries added to the reader transactions: they compare what the transaction reads with the records at its snapshot
+def check_select(key, expected):
+    result = query.select(key, 0, [1, 1, 1, 1, 1])
+    if expected is None and result != []:
+        print('snapshot select error on', key, ':', result, ', correct: deleted')
+    elif expected is not None and (len(result) != 1 or result[0].columns != expected):
+        print('snapshot select error on', key, ':', result, ', correct:', expected)
+    return True
+
+def check_select_column(value, column, expected_keys):
+    result = sorted(record.columns[0] for record in query.select(value, column, [1, 1, 1, 1, 1]))
+    if result != expected_keys:
+        print('snapshot select error on column', column, '=', value, ':', result, ', correct:', expected_keys)
+    return True
+
+def check_sum(start, end, expected):
+    result = query.sum(start, end, 2)
+    if result != expected:
+        print('snapshot sum error on [', start, ',', end, ']: ', result, ', correct: ', expected)
+    return True
+
+for i in range(0, number_of_records):
+    key = 92106429 + i
+    records[key] = [key, randint(0, 20), randint(0, 20), randint(0, 20), randint(0, 20)]
+    query.insert(*records[key])
+keys = sorted(list(records.keys()))
+print("Insert finished")
+
+# Snapshot reads: a reader starts, other queries update, delete and insert records, then the reader checks it still sees the records as they were when it started
+snapshot = {key: list(columns) for key, columns in records.items()}
+snapshot_time = mvcc.clock.now()
+reader = Transaction()
+pause = Pause()
+reader.add_query(pause.pause, grades_table)
+for key in sample(keys, 200):
+    reader.add_query(check_select, grades_table, key, snapshot[key])
+for value in range(0, 21, 5):
+    reader.add_query(check_select_column, grades_table, value, 1, sorted(key for key in keys if snapshot[key][1] == value))
+for i in range(0, number_of_aggregates):
+    r = sorted(sample(range(0, len(keys)), 2))
+    reader.add_query(check_sum, grades_table, keys[r[0]], keys[r[1]], sum(snapshot[key][2] for key in keys[r[0]: r[1] + 1]))
+thread, results = start_paused(reader, pause)
+
+for _ in range(number_of_updates):
+    key = choice(keys)
+    updated_columns = [None, randint(0, 20), randint(0, 20), None, None]
+    records[key][1] = updated_columns[1]
+    records[key][2] = updated_columns[2]
+    query.update(key, *updated_columns)
+deleted_keys = sample(keys, number_of_deletes)
+for key in deleted_keys:
+    query.delete(key)
+    records.pop(key)
+for i in range(number_of_records, number_of_records + number_of_deletes):
+    key = 92106429 + i
+    records[key] = [key, randint(0, 20), randint(0, 20), randint(0, 20), randint(0, 20)]
+    query.insert(*records[key])
+
+if not finish(thread, results, pause):
+    print('snapshot reader aborted')
+print("Snapshot read finished")
+
+# a reader starting now sees every change
+keys = sorted(list(records.keys()))
+reader = Transaction()
+for key in deleted_keys:
+    reader.add_query(check_select, grades_table, key, None)
+for key in sample(keys, 200):
+    reader.add_query(check_select, grades_table, key, records[key])
+for value in range(0, 21, 5):
+    reader.add_query(check_select_column, grades_table, value, 1, sorted(key for key in keys if records[key][1] == value))
+for i in range(0, number_of_aggregates):
+    r = sorted(sample(range(0, len(keys)), 2))
+    reader.add_query(check_sum, grades_table, keys[r[0]], keys[r[1]], sum(records[key][2] for key in keys[r[0]: r[1] + 1]))
+if not reader.run():
+    print('reader aborted')
+print("Latest read finished")
+
+# As-of reads: the records as they were at the commit timestamp of the snapshot, and as they are now
+grades_table.index.create_index(1) # created after the updates, as_of reads on column 1 cannot rely on it
+snapshot_keys = sorted(snapshot.keys())
+for key in deleted_keys:
+    result = query.select_as_of(key, 0, [1, 1, 1, 1, 1], snapshot_time)
+    if len(result) != 1 or result[0].columns != snapshot[key]:
+        print('select_as_of error on', key, ':', result, ', correct:', snapshot[key])
+    if query.select_as_of(key, 0, [1, 1, 1, 1, 1], mvcc.clock.now()) != []:
+        print('select_as_of error on', key, ': deleted record returned')
+for value in range(0, 21, 5):
+    result = sorted(record.columns[0] for record in query.select_as_of(value, 1, [1, 1, 1, 1, 1], snapshot_time))
+    correct = sorted(key for key in snapshot_keys if snapshot[key][1] == value)
+    if result != correct:
+        print('select_as_of error on column 1 =', value, ':', result, ', correct:', correct)
+    result = sorted(record.columns[0] for record in query.select_as_of(value, 1, [1, 1, 1, 1, 1], mvcc.clock.now()))
+    correct = sorted(key for key in keys if records[key][1] == value)
+    if result != correct:
+        print('select_as_of error on column 1 =', value, ':', result, ', correct:', correct)
+for i in range(0, number_of_aggregates):
+    r = sorted(sample(range(0, len(snapshot_keys)), 2))
+    column_sum = sum(snapshot[key][2] for key in snapshot_keys[r[0]: r[1] + 1])
+    result = query.sum_as_of(snapshot_keys[r[0]], snapshot_keys[r[1]], 2, snapshot_time)
+    if column_sum != result:
+        print('sum_as_of error on [', snapshot_keys[r[0]], ',', snapshot_keys[r[1]], ']: ', result, ', correct: ', column_sum)
+print("As-of read finished")
+
+# Lock hierarchy: a transaction holding locks pauses, then the transactions that conflict with it must abort and the others commit
+def check_locks(name, holder_queries, expectations):
+    holder = Transaction(snapshot_isolation=False)
+    pause = Pause()
+    for query_args in holder_queries:
+        holder.add_query(query_args[0], grades_table, *query_args[1:])
+    holder.add_query(pause.pause, grades_table)
+    thread, results = start_paused(holder, pause)
+    for description, queries, expected in expectations:
+        if run_alone(*queries, snapshot_isolation=False) != expected:
+            print('lock error while', name, ':', description, 'should', 'commit' if expected else 'abort')
+    if not finish(thread, results, pause):
+        print('lock error:', name, 'aborted')
+
+key = keys[100]
+same_range_key = next(other for other in keys if other != key and grades_table.index.locate(0, other)[0] // 64 == grades_table.index.locate(0, key)[0] // 64)
+other_range_key = keys[-1]
+new_key = 92106429 + number_of_records + number_of_deletes
+
+# S on the record, IS on its page range and on the table
+check_locks('reading a record', [(query.select, key, 0, [1, 1, 1, 1, 1])], [
+    ('updating the record', [(query.update, key, None, None, None, 1, None)], False),
+    ('updating a record of the same page range', [(query.update, same_range_key, None, None, None, 1, None)], True),
+    ('updating a record of another page range', [(query.update, other_range_key, None, None, None, 1, None)], True),
+    ('summing the page range', [(query.sum, key, key, 2)], True),
+    ('inserting a record', [(query.insert, new_key, 0, 0, 0, 0)], True),
+])
+# S on the page ranges of the key range and on the set of records that could be inserted
+check_locks('summing a key range', [(query.sum, keys[0], keys[100], 2)], [
+    ('updating a record of the range', [(query.update, key, None, None, None, 2, None)], False),
+    ('updating a record of another page range', [(query.update, other_range_key, None, None, None, 2, None)], True),
+    ('inserting a record', [(query.insert, new_key + 1, 0, 0, 0, 0)], False),
+    ('reading a record of the range', [(query.select, key, 0, [1, 1, 1, 1, 1])], True),
+])
+# X on the record, IX on its page range and on the table
+check_locks('updating a record', [(query.update, key, None, None, None, 3, None)], [
+    ('updating the record', [(query.update, key, None, None, None, 4, None)], False),
+    ('deleting the record', [(query.delete, key)], False),
+    ('updating a record of the same page range', [(query.update, same_range_key, None, None, None, 3, None)], True),
+    ('summing the page range', [(query.sum, key, key, 2)], False),
+    ('reading the record among others', [(query.select_many, [other_range_key, key], 0, [1, 1, 1, 1, 1])], False),
+    ('reading other records', [(query.select_many, [other_range_key, keys[-2]], 0, [1, 1, 1, 1, 1])], True),
+    ('counting the page range', [(query.aggregate, 'count', 2, key, key)], False),
+    ('counting another page range', [(query.aggregate, 'count', 2, other_range_key, other_range_key)], True),
+    ('reading the key range', [(query.select_range_iter, key, key, 0, [1, 1, 1, 1, 1])], False),
+    ('scanning the table', [(query.scan, [(2, '>=', 0)], [1, 1, 1, 1, 1])], False),
+])
+
+# snapshot reads take no locks: they run next to the writer and read the version committed before they started
+holder = Transaction(snapshot_isolation=False)
+pause = Pause()
+holder.add_query(query.update, grades_table, key, None, None, 20, None, None)
+holder.add_query(pause.pause, grades_table)
+thread, results = start_paused(holder, pause)
+expected = query.select(key, 0, [1, 1, 1, 1, 1])[0].columns # the holder is still running, its update is the latest version
+expected[2] = records[key][2]
+if not run_alone((check_select, key, expected), (check_sum, key, key, expected[2])):
+    print('lock error: snapshot reads next to a writer aborted')
+finish(thread, results, pause)
+records[key][2] = 20
+
+# first committer wins: a transaction may not update a record that changed after its snapshot was taken
+writer = Transaction()
+pause = Pause()
+writer.add_query(pause.pause, grades_table)
+writer.add_query(query.update, grades_table, key, None, None, 0, None, None)
+thread, results = start_paused(writer, pause)
+if not run_alone((query.update, key, None, None, 1, None, None)):
+    print('lock error: update next to a paused snapshot aborted')
+if finish(thread, results, pause):
+    print('lock error: update of a record changed after the snapshot committed')
+print("Lock finished")
+
+db.close()
+shutil.rmtree('./ST', ignore_errors=True)
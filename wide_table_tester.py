@@ -0,0 +1,81 @@
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+from random import choice, randint, sample, seed
+import shutil
+
+db = Database()
+db.open('./WT')
+# Tables wider than the 31 columns the schema encoding has bits for: the last columns share one bit
+number_of_columns = 40
+number_of_records = 200
+number_of_updates = 1000
+number_of_aggregates = 50
+
+seed(3562901)
+
+for cumulative in [True, False]:
+    table = db.create_table('Wide' + str(cumulative), number_of_columns, 0, cumulative=cumulative)
+    query = Query(table)
+    records = {}
+    versions = {} # key: primary key, value: the previous versions of the record, oldest first
+    for i in range(0, number_of_records):
+        key = 92106429 + i
+        records[key] = [key] + [randint(0, 20) for j in range(1, number_of_columns)]
+        versions[key] = []
+        query.insert(*records[key])
+    keys = sorted(list(records.keys()))
+
+    # updates of one or two columns, mostly past the shared bit
+    for _ in range(number_of_updates):
+        key = choice(keys)
+        updated_columns = [None]*number_of_columns
+        for column in sample([choice(range(1, 30)), choice(range(30, number_of_columns)), choice(range(30, number_of_columns))], randint(1, 2)):
+            updated_columns[column] = randint(0, 20)
+        versions[key].append(list(records[key]))
+        for column in range(number_of_columns):
+            if updated_columns[column] is not None:
+                records[key][column] = updated_columns[column]
+        if not query.update(key, *updated_columns):
+            print('update error on', key, ':', updated_columns)
+
+    # transactions updating the last column, the aborted one is undone
+    key = keys[0]
+    transaction = Transaction()
+    transaction.add_query(query.update, table, key, *([None]*(number_of_columns-1) + [99]))
+    if transaction.run():
+        versions[key].append(list(records[key]))
+        records[key][number_of_columns-1] = 99
+    else:
+        print('transaction error on', key)
+    transaction = Transaction()
+    transaction.add_query(query.update, table, key, *([None]*(number_of_columns-1) + [100]))
+    transaction.add_query(query.update, table, -1, *([None]*number_of_columns)) # no such key, aborts the transaction
+    if transaction.run():
+        print('transaction error on', key, ': committed an update of a missing key')
+
+    for key in keys:
+        record = query.select(key, 0, [1]*number_of_columns)[0]
+        if record.columns != records[key]:
+            print('select error on', key, ':', record.columns, ', correct:', records[key])
+        for version in [-1, -2]:
+            correct = versions[key][version] if len(versions[key]) >= -version else versions[key][0] if versions[key] else records[key]
+            record = query.select_version(key, 0, [1]*number_of_columns, version)[0]
+            if record.columns != correct:
+                print('select_version', version, 'error on', key, ':', record.columns, ', correct:', correct)
+    for i in range(0, number_of_aggregates):
+        r = sorted(sample(range(0, len(keys)), 2))
+        column = choice(range(30, number_of_columns))
+        column_sum = sum(records[key][column] for key in keys[r[0]: r[1] + 1])
+        result = query.sum(keys[r[0]], keys[r[1]], column)
+        if column_sum != result:
+            print('sum error on [', keys[r[0]], ',', keys[r[1]], '] column', column, ':', result, ', correct:', column_sum)
+    result = sorted(record.rid for record in query.scan([(number_of_columns-1, '>=', 10)], [1] + [0]*(number_of_columns-1)))
+    correct = sorted(table.index.locate(0, key)[0] for key in keys if records[key][number_of_columns-1] >= 10)
+    if result != correct:
+        print('scan error on column', number_of_columns-1, ':', len(result), 'records, correct:', len(correct))
+    print("Wide table finished, cumulative:", cumulative)
+
+db.close()
+shutil.rmtree('./WT', ignore_errors=True)